@@ -0,0 +1,253 @@
+# bench_bridge.py - end-to-end bridge workloads against a simulated gateway on an in-process broker
+# usage: python benchmarks/bench_bridge.py [--bus-rate N] [--workers N] [--no-alloc] [workload ...]
+# workloads: slider, all_off, scene, panel_storm, large_site (default: all of them)
+#
+# Messages go through main.mqtt_callback exactly as in production; the bus
+# scheduler is off unless --bus-rate is given, so the numbers show bridge CPU
+# rather than Dynet bus pacing. Per workload it reports throughput and p50/p99
+# of the time each message holds the network loop (the whole handler, or only
+# the hand-off with --workers), and (in a second, traced pass) tracemalloc peak and
+# net retained bytes per message.
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+import mqtt_handlers
+from sim_gateway import SimulatedGateway
+from command_debouncer import command_debouncer
+from scene_planner import scene_planner
+from config import (
+    MQTT_HOMEASSISTANT_PREFIX, MQTT_DYNALITE_RAW_TOPIC, DYNET_INGEST, RESPONSE_TTL,
+    PUBLISH_COALESCE_MS, PUBLISH_BATCH_SIZE
+)
+from dispatcher import KeyedDispatcher
+from config_loader import load_dynalite_config, compile_dynalite_index, INDEX_KEY
+from discovery import build_light_discovery
+from mqtt.local_broker import LocalBroker, LocalMQTTClient
+from pending_responses import PendingResponses
+from state_cache import state_cache
+from utils import flush_logs
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dynalite_map.yaml")
+
+
+def command_topic(area, channel):
+    return f"{MQTT_HOMEASSISTANT_PREFIX}/light/dynet_area_{area}/channel_{channel}/brightness/set"
+
+
+def synthetic_map(areas=1000, channels=8):
+    dynalite_map = {
+        "defaults": {"presets": [1, 2, 3, 4], "levels": [255, 178, 26, 0]},
+        "areas": {
+            area: {
+                "name": f"Area {area}",
+                "channels": {"all": {"name": f"Area {area} (Master)"},
+                             **{str(ch): {"name": f"Light {ch}"} for ch in range(1, channels + 1)}}
+            }
+            for area in range(1, areas + 1)
+        }
+    }
+    dynalite_map[INDEX_KEY] = compile_dynalite_index(dynalite_map)
+    return dynalite_map
+
+
+class Bridge:
+    """The bridge wired to a fresh LocalBroker, with handler timing around main.mqtt_callback."""
+
+    def __init__(self, dynalite_map, bus_rate=0):
+        self.broker = LocalBroker(asyncio.get_running_loop())
+        self.gateway = SimulatedGateway(self.broker)
+        self.ha = LocalMQTTClient(self.broker, on_message=self._on_state)
+        self.client = LocalMQTTClient(
+            self.broker, on_connect=mqtt_handlers.handle_mqtt_connect, on_message=self._on_message,
+            coalesce_window=PUBLISH_COALESCE_MS / 1000, batch_size=PUBLISH_BATCH_SIZE,
+            raw_topics=(MQTT_DYNALITE_RAW_TOPIC,) if DYNET_INGEST == "raw" else ())
+        self.samples = []
+        self.states = 0
+
+        state_cache.clear()
+        main.dynalite_map = dynalite_map
+        main.pending_responses = PendingResponses(ttl=RESPONSE_TTL)
+        main.mqtt_client = mqtt_handlers.mqtt_client = self.client
+        mqtt_handlers.gateways.bus_rate = bus_rate
+        mqtt_handlers.configure_gateways(dynalite_map)
+        main.router = main.build_router()
+
+    async def start(self):
+        self.gateway.start()
+        self.ha.connect()
+        self.ha.subscribe(f"{MQTT_HOMEASSISTANT_PREFIX}/light/+/+/brightness")
+        self.client.connect()
+        await asyncio.sleep(0.01)
+        self.samples.clear()
+        self.states = 0
+
+    def _on_state(self, topic, payload, retain=False):
+        self.states += 1
+
+    def _on_message(self, topic, payload, retain=False):
+        started = time.perf_counter_ns()
+        main.mqtt_callback(topic, payload, retain)
+        self.samples.append(time.perf_counter_ns() - started)
+
+    def busy(self) -> bool:
+        queue = self.client.publish_queue
+        return bool(
+            len(main.pending_responses)
+            or self.gateway.inflight
+            or command_debouncer.stats()["active"]
+            or scene_planner.stats()["pending"]
+            or (main.dispatcher is not None and not main.dispatcher.idle())
+            or any(gw.scheduler is not None and any(s["depth"] for s in gw.scheduler.stats().values())
+                   for gw in mqtt_handlers.gateways)
+            or (queue is not None and queue.depth)
+        )
+
+    async def settle(self, timeout=120.0):
+        deadline = time.monotonic() + timeout
+        await asyncio.sleep(0.005)   # let messages already published reach the bridge
+        while self.busy() and time.monotonic() < deadline:
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(PUBLISH_COALESCE_MS / 1000 + 0.01)
+
+
+def mapped_channels(dynalite_map):
+    return [(area, str(ch)) for area, cfg in dynalite_map.get("areas", {}).items()
+            for ch in (cfg.get("channels") or {})]
+
+
+async def slider(bridge, steps=100, interval=0.01):
+    area, channel = next(key for key in mapped_channels(main.dynalite_map) if key[1] != "all")
+    for step in range(steps):
+        bridge.ha.publish(command_topic(area, channel), str(round(step * 255 / (steps - 1))))
+        await asyncio.sleep(interval)
+
+
+async def all_off(bridge):
+    for area, channel in mapped_channels(main.dynalite_map):
+        if channel == "all":
+            bridge.ha.publish(command_topic(area, channel), "0")
+    await asyncio.sleep(0)
+
+
+async def scene(bridge):
+    # HA scenes: every light of each area to one preset level, then a mix that matches no preset
+    areas = {}
+    for area, channel in mapped_channels(main.dynalite_map):
+        if channel != "all":
+            areas.setdefault(area, []).append(channel)
+    for brightness in ("255", "0"):
+        for area, channels in areas.items():
+            for channel in channels:
+                bridge.ha.publish(command_topic(area, channel), brightness)
+        await bridge.settle()
+    for area, channels in areas.items():
+        for idx, channel in enumerate(channels):
+            bridge.ha.publish(command_topic(area, channel), ("255", "26")[idx % 2])
+
+
+async def panel_storm(bridge, presses=2000, burst=50):
+    rng = random.Random(1)
+    areas = list(main.dynalite_map.get("areas", {}))
+    for press in range(presses):
+        bridge.gateway.panel_press(rng.choice(areas), rng.randrange(4))
+        if press % burst == burst - 1:
+            await asyncio.sleep(0)
+
+
+async def large_site(bridge):
+    await panel_storm(bridge, presses=5000)
+    await all_off(bridge)
+
+
+WORKLOADS = {
+    "slider": (lambda: load_dynalite_config(CONFIG), slider),
+    "all_off": (lambda: load_dynalite_config(CONFIG), all_off),
+    "scene": (lambda: load_dynalite_config(CONFIG), scene),
+    "panel_storm": (lambda: load_dynalite_config(CONFIG), panel_storm),
+    "large_site": (synthetic_map, large_site),
+}
+
+
+async def run_workload(name, bus_rate, traced):
+    make_map, workload = WORKLOADS[name]
+    bridge = Bridge(make_map(), bus_rate)
+    await bridge.start()
+    if traced:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    await workload(bridge)
+    await bridge.settle()
+    report = {
+        "messages": len(bridge.samples),
+        "frames": bridge.gateway.frames,
+        "states": bridge.states,
+        "samples": sorted(bridge.samples),
+    }
+    if traced:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        report["net"] = (current - before) / max(1, report["messages"])
+        report["peak"] = (peak - before) / 1024
+    bridge.client.stop()
+    return report
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))] / 1000 if values else 0.0
+
+
+async def amain(names, bus_rate, alloc, workers):
+    setup = {}
+    if workers > 0:
+        main.dispatcher = KeyedDispatcher(workers=workers)
+    if "large_site" in names:
+        started = time.perf_counter()
+        site = synthetic_map()
+        setup["index 1000 areas"] = time.perf_counter() - started
+        started = time.perf_counter()
+        build_light_discovery(site)
+        setup["discovery 1000 areas"] = time.perf_counter() - started
+
+    results = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name in names:
+            report = await run_workload(name, bus_rate, traced=False)
+            if alloc:
+                traced = await run_workload(name, bus_rate, traced=True)
+                report["net"], report["peak"] = traced["net"], traced["peak"]
+            results.append((name, report))
+        flush_logs()
+
+    for name, seconds in setup.items():
+        print(f"{name:22s} {seconds * 1000:8.1f} ms")
+    print(f"{'workload':12s} {'msgs':>6s} {'frames':>6s} {'states':>6s} {'msg/s':>9s} "
+          f"{'p50 µs':>8s} {'p99 µs':>8s} {'peak KiB':>9s} {'net B/msg':>9s}")
+    for name, r in results:
+        busy = sum(r["samples"]) / 1e9
+        print(f"{name:12s} {r['messages']:6d} {r['frames']:6d} {r['states']:6d} "
+              f"{r['messages'] / busy if busy else 0:9.0f} "
+              f"{percentile(r['samples'], 0.5):8.1f} {percentile(r['samples'], 0.99):8.1f} "
+              + (f"{r['peak']:9.1f} {r['net']:9.1f}" if "peak" in r else f"{'-':>9s} {'-':>9s}"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("workloads", nargs="*", default=list(WORKLOADS))
+    parser.add_argument("--bus-rate", type=float, default=0, help="Dynet frames/s through the bus scheduler (0 = unpaced)")
+    parser.add_argument("--workers", type=int, default=0, help="dispatch handlers to N worker threads (0 = inline)")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    args = parser.parse_args()
+    unknown = set(args.workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workload(s): {', '.join(sorted(unknown))}")
+    asyncio.run(amain(args.workloads or list(WORKLOADS), args.bus_rate, not args.no_alloc, args.workers))
@@ -0,0 +1,37 @@
+# bench_dynet_frame.py - DynetFrame codec vs the hex-string builders in helpers/dynet_mqtt.py
+# usage: python benchmarks/bench_dynet_frame.py [iterations]
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.dynet_frame import DynetFrame, encode_dynet1_into
+from helpers.dynet_mqtt import (
+    build_area_preset_body,
+    build_request_current_preset,
+    build_request_set_preset_dyn1
+)
+
+
+def run(number=100_000):
+    buf = bytearray(8)
+    raw = bytes(DynetFrame.set_preset_dyn1(13, 2, 3))
+    cases = [
+        ("builder  set_preset_dyn1 (hex)", lambda: build_request_set_preset_dyn1(13, 2, 3)),
+        ("codec    set_preset_dyn1 (bytes)", lambda: DynetFrame.set_preset_dyn1(13, 2, 3)),
+        ("codec    set_preset_dyn1 (hex)", lambda: DynetFrame.set_preset_dyn1(13, 2, 3).hex_string),
+        ("codec    encode_dynet1_into", lambda: encode_dynet1_into(buf, 0, 13, 2, 0x6B, 1, 0, 0xFF)),
+        ("builder  request_current_preset", lambda: build_request_current_preset(13, channel=3)),
+        ("codec    request_current_preset", lambda: DynetFrame.request_current_preset(13, channel=3)),
+        ("builder  area_preset_body (dyn2)", lambda: build_area_preset_body(13, 2)),
+        ("codec    area_preset_dyn2", lambda: DynetFrame.area_preset_dyn2(13, 2)),
+        ("codec    decode dynet1", lambda: DynetFrame.decode(raw)),
+    ]
+    for name, func in cases:
+        elapsed = timeit.timeit(func, number=number)
+        print(f"{name:36s} {elapsed / number * 1e9:8.0f} ns/op")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,44 @@
+# bench_fan_out.py - "all" fan-out: per-child nearest-level search vs the compiled index tables
+# usage: python benchmarks/bench_fan_out.py [iterations]
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_bridge import synthetic_map
+from config_loader import get_dynalite_index
+
+
+# each case walks the (child, level) pairs the way publish_preset_state does
+
+def legacy(children, master):
+    # what the handlers did per child before the index existed
+    for child in children:
+        levels = child.levels
+        closest = min(levels, key=lambda lv: abs(lv - master))
+        level = levels[levels.index(closest)]
+
+
+def per_child(children, master):
+    for child in children:
+        level = child.nearest_level[master]
+
+
+def run(number=20_000):
+    started = time.perf_counter()
+    index = get_dynalite_index(synthetic_map(areas=1000, channels=8))
+    print(f"{'index compile (1000 areas)':42s} {(time.perf_counter() - started) * 1000:9.1f} ms")
+    children = index.children[next(iter(index.children))]
+    cases = [
+        ("legacy lambda search (1 area)", lambda: legacy(children, 178)),
+        ("per-child nearest_level (1 area)", lambda: per_child(children, 178)),
+    ]
+    for name, func in cases:
+        seconds = timeit.timeit(func, number=number)
+        print(f"{name:42s} {seconds / number * 1e9:9.0f} ns/op")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,41 @@
+# bench_logging.py - caller-side cost of a log line: legacy print vs queued lazy log
+# usage: python benchmarks/bench_logging.py [iterations]
+import contextlib
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils
+from utils import log, DEBUG, flush_logs
+
+
+def legacy_log(msg):
+    print(f"{datetime.now().strftime('%H:%M:%S')} 🧠 {msg}")
+
+
+def run(number=50_000):
+    level, preset, topic = 178, 2, "homeassistant/light/dynet_area_16/channel_all/brightness"
+    cases = [
+        ("legacy f-string + print", lambda: legacy_log(f"✅ Preset {preset} = Brightness: {round((level/255)*100,0)}% published to {topic}")),
+        ("queued lazy log (INFO)", lambda: log("✅ Preset %s = Brightness: %.0f%% published to %s", preset, level * 100 / 255, topic)),
+        ("filtered lazy log (DEBUG)", lambda: log("✅ Preset %s = Brightness: %.0f%% published to %s", preset, level * 100 / 255, topic, level=DEBUG)),
+    ]
+    results = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name, func in cases:
+            started = time.perf_counter()
+            for _ in range(number):
+                func()
+            caller = time.perf_counter() - started
+            flush_logs()  # include draining the writer in the total
+            results.append((name, caller, time.perf_counter() - started))
+    print(f"log level: {utils.LEVEL_NAMES[utils._min_level]}")
+    for name, caller, total in results:
+        print(f"{name:28s} caller {caller / number * 1e9:7.0f} ns/line   incl. writer {total / number * 1e9:7.0f} ns/line")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
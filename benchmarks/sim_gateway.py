@@ -0,0 +1,99 @@
+# sim_gateway.py - simulated Dynet gateway on a LocalBroker, for benchmarks
+# Answers frames on {prefix}/set with set/res/<id> acks and replies to
+# current-preset requests from the presets it was told to recall.
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import MQTT_DYNALITE_PREFIX, MQTT_DYNALITE_RAW_TOPIC, DYNET_INGEST
+from helpers.dynet_frame import DynetFrame
+from mqtt.local_broker import LocalMQTTClient
+
+CHANNEL_ALL = 0xFF
+
+
+class SimulatedGateway:
+    def __init__(self, broker, ack_delay=0.005, reply_delay=0.02, raw=DYNET_INGEST == "raw",
+                 prefix=MQTT_DYNALITE_PREFIX):
+        self.loop = broker.loop
+        self.prefix = prefix
+        self.raw_topic = MQTT_DYNALITE_RAW_TOPIC if prefix == MQTT_DYNALITE_PREFIX else f"{prefix}/raw"
+        self.ack_delay = ack_delay
+        self.reply_delay = reply_delay
+        self.raw = raw
+        self.client = LocalMQTTClient(broker, on_message=self._on_frame)
+        self._presets = {}   # (area, zero-based channel or 0xFF) -> (seq, preset zero based)
+        self._seq = 0
+        self.frames = 0
+        self.acks = 0
+        self.replies = 0
+        self.inflight = 0    # acks and replies scheduled but not sent yet
+
+    def start(self):
+        self.client.connect()
+        self.client.subscribe(f"{self.prefix}/set")
+
+    def _later(self, delay, func, *args):
+        self.inflight += 1
+        if delay > 0:
+            self.loop.call_later(delay, self._fire, func, args)
+        else:
+            self.loop.call_soon(self._fire, func, args)
+
+    def _fire(self, func, args):
+        self.inflight -= 1
+        func(*args)
+
+    def _on_frame(self, topic, payload, retain=False):
+        message = json.loads(payload)
+        frame = DynetFrame.from_hex(message["hex_string"]) if message.get("type") == "dynet1" else None
+        self.frames += 1
+        self._later(self.ack_delay, self._ack, message["response_id"])
+        if frame is None:
+            return
+        data = frame.data
+        if frame.opcode == 0x6B:       # recall preset: data1 = channel, data2 = preset
+            self._seq += 1
+            self._presets[(data[1], data[2])] = (self._seq, data[4])
+        elif frame.opcode == 0x63:     # request current preset: data2 = channel
+            self._later(self.reply_delay, self._reply, data[1], data[4])
+
+    def _ack(self, response_id):
+        self.acks += 1
+        self.client.publish(f"{self.prefix}/set/res/{response_id}", '{"status": "OK"}')
+
+    def current_preset(self, area, channel):
+        own = self._presets.get((area, channel), (0, 0))
+        whole = self._presets.get((area, CHANNEL_ALL), (0, 0))
+        return max(own, whole)[1]
+
+    def _reply(self, area, channel):
+        self.replies += 1
+        self.report(area, channel, self.current_preset(area, channel))
+
+    def report(self, area, channel, preset):
+        """Publish a current-preset report (zero-based channel and preset) the way the gateway would."""
+        if self.raw:
+            frame = DynetFrame.dynet1(area, preset, 0x62, channel, 0x00)
+            self.client.publish(self.raw_topic, bytes(frame.data))
+        else:
+            self.client.publish(self.prefix, json.dumps({
+                "description": "Reply Current Preset",
+                "type": "dynet1",
+                "fields": [area, preset + 1, None if channel == CHANNEL_ALL else channel],
+                "field_types": {"0": "MES_AREA", "1": "MES_PRESET", "2": "MES_CHANNEL_ZERO_BASED"}
+            }))
+
+    def panel_press(self, area, preset):
+        """A wall panel recalling an area preset (zero based), as seen on the bus."""
+        if self.raw:
+            self.client.publish(self.raw_topic, bytes(DynetFrame.dynet1(area, preset, 0x65, 0x00, 0x00).data))
+        else:
+            self.client.publish(self.prefix, json.dumps({
+                "description": "Select Preset",
+                "type": "dynet1",
+                "fields": [area, preset + 1],
+                "field_types": {"0": "MES_AREA", "1": "MES_PRESET"}
+            }))
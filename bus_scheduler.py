@@ -0,0 +1,145 @@
+# bus_scheduler.py
+import threading
+import time
+from collections import deque
+
+PRIORITY_USER = 0      # HA commands
+PRIORITY_CONFIRM = 1   # confirmation polls
+PRIORITY_BULK = 2      # sync sweeps / bulk state refreshes
+PRIORITY_NAMES = ("user", "confirm", "bulk")
+
+
+class DynetBusScheduler:
+    """
+    Outbound Dynet frame scheduler for the slow RS485 bus behind the gateway.
+
+    A token bucket (`rate` frames/s, `burst` deep) paces sends; queued frames go
+    out strictly by priority class, and round-robin across areas within a class
+    so one busy area can't starve the others.
+    """
+
+    def __init__(self, call_later, rate: float = 40, burst: int = 10, max_queue: int = 500):
+        """
+        :param call_later: Scheduler, call_later(delay_seconds, func)
+        :param rate: Sustained frames per second
+        :param burst: Bucket size, frames that may go out back to back
+        :param max_queue: Max queued frames over all classes
+        """
+        self.call_later = call_later
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._queues = [{} for _ in PRIORITY_NAMES]        # area -> deque of (enqueued_at, send)
+        self._rr = [deque() for _ in PRIORITY_NAMES]       # area round-robin order per class
+        self._depth = [0] * len(PRIORITY_NAMES)
+        self._drain_scheduled = False
+
+        # metrics
+        self.sent = [0] * len(PRIORITY_NAMES)
+        self.dropped = [0] * len(PRIORITY_NAMES)
+        self.wait_total = [0.0] * len(PRIORITY_NAMES)
+        self.wait_max = [0.0] * len(PRIORITY_NAMES)
+
+    @property
+    def depth(self) -> int:
+        return sum(self._depth)
+
+    def submit(self, send, priority: int = PRIORITY_USER, area=None) -> bool:
+        """
+        Queue `send` (a no-arg callable that publishes one frame).
+        Returns False when the frame was dropped because the queue is full.
+        """
+        with self._lock:
+            if self.depth >= self.max_queue and not self._evict_below(priority):
+                self.dropped[priority] += 1
+                return False
+            queue = self._queues[priority].get(area)
+            if queue is None:
+                queue = self._queues[priority][area] = deque()
+                self._rr[priority].append(area)
+            queue.append((time.monotonic(), send))
+            self._depth[priority] += 1
+        self.drain()
+        return True
+
+    def _evict_below(self, priority) -> bool:
+        # make room by dropping the oldest frame of the lowest class below `priority`
+        for lower in range(len(PRIORITY_NAMES) - 1, priority, -1):
+            if self._depth[lower]:
+                self._pop_oldest(lower)
+                self.dropped[lower] += 1
+                return True
+        return False
+
+    def _pop_oldest(self, priority):
+        # each area queue is FIFO, so the oldest frame of the class is one of the heads;
+        # a linear scan is fine as this only runs when the queue is full
+        queues = self._queues[priority]
+        area = min(queues, key=lambda a: queues[a][0][0])
+        queue = queues[area]
+        item = queue.popleft()
+        if not queue:
+            del queues[area]
+            self._rr[priority].remove(area)
+        self._depth[priority] -= 1
+        return item
+
+    def _pop(self, priority):
+        rr = self._rr[priority]
+        area = rr.popleft()
+        queue = self._queues[priority][area]
+        item = queue.popleft()
+        if queue:
+            rr.append(area)
+        else:
+            del self._queues[priority][area]
+        self._depth[priority] -= 1
+        return item
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def drain(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                priority = next((p for p, d in enumerate(self._depth) if d), None)
+                if priority is None:
+                    self._drain_scheduled = False
+                    return
+                if self._tokens < 1:
+                    if not self._drain_scheduled:
+                        self._drain_scheduled = True
+                        self.call_later((1 - self._tokens) / self.rate, self._scheduled_drain)
+                    return
+                self._tokens -= 1
+                enqueued_at, send = self._pop(priority)
+                wait = now - enqueued_at
+                self.sent[priority] += 1
+                self.wait_total[priority] += wait
+                if wait > self.wait_max[priority]:
+                    self.wait_max[priority] = wait
+            send()
+
+    def _scheduled_drain(self):
+        with self._lock:
+            self._drain_scheduled = False
+        self.drain()
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "depth": self._depth[p],
+                "sent": self.sent[p],
+                "dropped": self.dropped[p],
+                "avg_wait": self.wait_total[p] / self.sent[p] if self.sent[p] else 0.0,
+                "max_wait": self.wait_max[p]
+            }
+            for p, name in enumerate(PRIORITY_NAMES)
+        }
@@ -0,0 +1,103 @@
+# command_debouncer.py
+import threading
+from config import COMMAND_DEBOUNCE_MS
+
+
+class CommandDebouncer:
+    """
+    Leading + trailing edge throttle per key (area, channel).
+
+    The first command of a burst goes out at once; while commands keep arriving
+    only the latest one is sent per `window`, superseded ones are dropped, and
+    a single confirmation is sent once the burst has settled.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._lock = threading.Lock()
+        self._active = {}  # key -> [pending send, confirm, call_later, last sent value, pending value]
+        self.submitted = 0
+        self.sent = 0
+        self.dropped = 0
+        self.confirms = 0
+        self.confirms_merged = 0
+
+    def submit(self, key, send, confirm, call_later, value=None):
+        """
+        :param key: Debounce key, e.g. (area, channel)
+        :param send: Callable sending the command frame
+        :param confirm: Callable sending the confirmation request (or None)
+        :param call_later: Scheduler, call_later(delay_seconds, func, *args)
+        :param value: What `send` sets (e.g. the preset); a trailing send equal to the last one is skipped
+        """
+        if self.window <= 0:
+            with self._lock:
+                self.submitted += 1
+            self._send(send)
+            self._confirm(confirm)
+            return
+
+        with self._lock:
+            self.submitted += 1
+            state = self._active.get(key)
+            if state is not None:
+                if state[0] is not None:
+                    self.dropped += 1
+                if state[1] is not None:
+                    self.confirms_merged += 1
+                state[0] = send
+                state[1] = confirm
+                state[4] = value
+                return
+            self._active[key] = [None, confirm, call_later, value, None]
+
+        self._send(send)
+        call_later(self.window, self._window_closed, key)
+
+    def _window_closed(self, key):
+        with self._lock:
+            state = self._active.get(key)
+            if state is None:
+                return
+            send, confirm, call_later, last_value, value = state
+            if send is None:
+                del self._active[key]
+            else:
+                state[0] = None
+                state[3] = value
+                if value is not None and value == last_value:
+                    # nothing new to send, but the stream is still going
+                    self.dropped += 1
+                    send = False
+
+        if send is None:
+            self._confirm(confirm)
+            return
+        if send:
+            # trailing edge; keep throttling while the stream continues
+            self._send(send)
+        call_later(self.window, self._window_closed, key)
+
+    def _send(self, send):
+        with self._lock:
+            self.sent += 1
+        send()
+
+    def _confirm(self, confirm):
+        if confirm is not None:
+            with self._lock:
+                self.confirms += 1
+            confirm()
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._active),
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "confirms": self.confirms,
+            "confirms_merged": self.confirms_merged
+        }
+
+
+command_debouncer = CommandDebouncer(window=COMMAND_DEBOUNCE_MS / 1000)
@@ -5,9 +5,41 @@ MQTT_USERNAME = os.getenv("MQTT_USERNAME", "")
 MQTT_PASSWORD = os.getenv("MQTT_PASSWORD", "")
 MQTT_DYNALITE_PREFIX = os.getenv("MQTT_DYNALITE_PREFIX", "dynalite")
 MQTT_HOMEASSISTANT_PREFIX = os.getenv("MQTT_HOMEASSISTANT_PREFIX", "homeassistant")                                         
+DYNET_INGEST = os.getenv("DYNET_INGEST", "json") # "json" (decoded packets on MQTT_DYNALITE_PREFIX) or "raw" (frames on MQTT_DYNALITE_RAW_TOPIC)
+MQTT_DYNALITE_RAW_TOPIC = os.getenv("MQTT_DYNALITE_RAW_TOPIC", f"{MQTT_DYNALITE_PREFIX}/raw")
 MQTT_DYNALITE_WILL = os.getenv("MQTT_DYNALITE_WILL","dynalite/status")
 MQTT_BRIDGE_WILL =  os.getenv("MQTT_BRIDGE_WILL", "bridges/light_dynalite") 
 MQTT_DEBUG =  os.getenv("MQTT_DEBUG", False) 
+MQTT_TRANSPORT = os.getenv("MQTT_TRANSPORT", "asyncio") # "asyncio" (single event loop) or "thread" (paho loop_start)
+PUBLISH_COALESCE_MS = int(os.getenv("PUBLISH_COALESCE_MS", 20)) # coalescing window for state publishes, 0 = publish directly
+PUBLISH_BATCH_SIZE = int(os.getenv("PUBLISH_BATCH_SIZE", 50))
+STATE_CACHE_MAX = int(os.getenv("STATE_CACHE_MAX", 4096)) # max state topics remembered for publish-if-changed
+STATE_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", 0)) # seconds before an unchanged state is re-published, 0 = never
+STATE_SEED_SECONDS = float(os.getenv("STATE_SEED_SECONDS", 3)) # how long to read retained state topics after connect
+COMMAND_DEBOUNCE_MS = int(os.getenv("COMMAND_DEBOUNCE_MS", 250)) # per area/channel HA command throttle window, 0 = off
+DYNET_BUS_RATE = float(os.getenv("DYNET_BUS_RATE", 40)) # outbound Dynet frames per second, 0 = unpaced
+DYNET_BUS_BURST = int(os.getenv("DYNET_BUS_BURST", 10))
+DYNET_BUS_QUEUE_MAX = int(os.getenv("DYNET_BUS_QUEUE_MAX", 500))
+RESPONSE_TTL = float(os.getenv("RESPONSE_TTL", 15)) # seconds to wait for a gateway ack before reporting it expired
+RESPONSE_ID_MODE = os.getenv("RESPONSE_ID_MODE", "counter") # "counter" (short base-36) or "uuid"
+RECOVERY_BATCH_SIZE = int(os.getenv("RECOVERY_BATCH_SIZE", 50)) # messages per batch when replaying after a reconnect
+RECOVERY_BATCH_INTERVAL_MS = int(os.getenv("RECOVERY_BATCH_INTERVAL_MS", 50))
+SYNC_ON_START = os.getenv("SYNC_ON_START", "true").lower() in ("1", "true", "yes") # poll all light levels after startup
+SYNC_START_DELAY = float(os.getenv("SYNC_START_DELAY", 5))
+SYNC_INTERVAL = float(os.getenv("SYNC_INTERVAL", 0)) # seconds between periodic sync sweeps, 0 = startup only
+STATE_STORE_PATH = os.getenv("STATE_STORE_PATH", "") # file for last-known light levels across restarts, empty = off
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO") # DEBUG, INFO, WARNING, ERROR
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text") # "text" or "json" (one object per line)
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() in ("1", "true", "yes") # write logs from a background thread
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0)) # fraction of HA commands traced end to end, 0 = off
+TRACE_TTL = float(os.getenv("TRACE_TTL", 30)) # seconds before an unfinished trace is closed
+TRACE_WINDOW = int(os.getenv("TRACE_WINDOW", 1024)) # recent traces kept for per-stage percentiles
+TRACE_DUMP_PATH = os.getenv("TRACE_DUMP_PATH", "") # append finished traces as JSON lines, empty = web UI only
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", 0)) # handler threads for inbound messages, 0 = handle on the network loop (single-threaded)
+DISPATCH_QUEUE_MAX = int(os.getenv("DISPATCH_QUEUE_MAX", 1000)) # messages queued per worker before backpressure
+DISPATCH_BLOCK_MS = int(os.getenv("DISPATCH_BLOCK_MS", 500)) # how long a full queue blocks the network loop before dropping
+SCENE_WINDOW_MS = int(os.getenv("SCENE_WINDOW_MS", 40)) # gather HA commands per area this long to send scenes as one area preset, 0 = off
+SCENE_FRAME = os.getenv("SCENE_FRAME", "dynet1") # area preset frame for collapsed scenes: "dynet1" (0x6B, channel all) or "dynet2" (0x11)
 SW_VER = os.getenv("SW_VER", "0.1a") 
 PRESET_NONE_OFF =  os.getenv("PRESET_NONE_OFF", True) #set Preset = None to Preset 4 (OFF). 
 CONFIG_PATH = os.getenv("CONFIG_PATH", "dynalite_map.yaml") 
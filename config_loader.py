@@ -1,6 +1,135 @@
 # config_loader.py
+from types import MappingProxyType
+from typing import NamedTuple, Optional
 import yaml
-from utils import log
+from utils import log, WARNING, ERROR
+from config import MQTT_HOMEASSISTANT_PREFIX
+
+INDEX_KEY = "_index"  # compiled lookup index attached to the loaded map
+
+
+class ChannelEntry(NamedTuple):
+    """Resolved, read-only view of one (area, channel) from dynalite_map.yaml."""
+    area: Optional[int]
+    channel: Optional[str]
+    presets: tuple
+    levels: tuple
+    preset_level: MappingProxyType  # preset -> level
+    nearest_preset: tuple           # brightness 0-255 -> closest preset (or None)
+    nearest_level: tuple            # brightness 0-255 -> closest configured level
+    state_topic: Optional[str]
+    mapped: bool
+    mode: str = "preset"            # "preset" (snap to the nearest preset) or "level" (direct 0x10 level frames)
+    fade: int = 50                  # fade field of level frames, as in build_channel_level_body
+
+
+class DynaliteIndex(NamedTuple):
+    channels: MappingProxyType  # (area, channel) -> ChannelEntry, channel as str or int
+    children: MappingProxyType  # area -> tuple of non-"all" ChannelEntry
+    defaults: ChannelEntry      # used for unmapped channels
+
+
+def _nearest_tables(presets: tuple, levels: tuple, cache: dict):
+    """`cache`: (presets, levels) -> tables, shared by identical channels within one compile."""
+    key = (presets, levels)
+    tables = cache.get(key)
+    if tables is not None:
+        return tables
+
+    nearest_preset = []
+    nearest_level = []
+    for brightness in range(256):
+        if levels:
+            # same tie-break as min(levels, key=...) / levels.index(): first closest wins
+            closest = min(levels, key=lambda lv: abs(lv - brightness))
+            idx = levels.index(closest)
+            nearest_level.append(closest)
+            nearest_preset.append(presets[idx] if idx < len(presets) else None)
+        else:
+            nearest_level.append(0)
+            nearest_preset.append(None)
+    tables = cache[key] = (tuple(nearest_preset), tuple(nearest_level))
+    return tables
+
+
+def _build_entry(area, channel, cfg, defaults, nearest_cache, mapped=True):
+    presets = tuple(cfg.get("presets", defaults.get("presets", [])))
+    levels = tuple(cfg.get("levels", defaults.get("levels", [])))
+
+    preset_level = {}
+    for idx, preset in enumerate(presets):
+        if preset not in preset_level:
+            preset_level[preset] = levels[idx] if idx < len(levels) else 0
+
+    nearest_preset, nearest_level = _nearest_tables(presets, levels, nearest_cache)
+
+    mode = str(cfg.get("mode", defaults.get("mode", "preset"))).lower()
+    if mode not in ("preset", "level") or (mode == "level" and channel == "all"):
+        if mapped:
+            log("⚠️ Unsupported mode %r for area %s channel %s — using preset", mode, area, channel, level=WARNING)
+        mode = "preset"
+
+    state_topic = None
+    if mapped:
+        state_topic = f"{MQTT_HOMEASSISTANT_PREFIX}/light/dynet_area_{area}/channel_{channel}/brightness"
+
+    return ChannelEntry(
+        area=area,
+        channel=channel,
+        presets=presets,
+        levels=levels,
+        preset_level=MappingProxyType(preset_level),
+        nearest_preset=nearest_preset,
+        nearest_level=nearest_level,
+        state_topic=state_topic,
+        mapped=mapped,
+        mode=mode,
+        fade=int(cfg.get("fade", defaults.get("fade", 50)))
+    )
+
+
+def compile_dynalite_index(dynalite_map: dict) -> DynaliteIndex:
+    """
+    Resolve defaults and precompute all per-message lookups once per config load,
+    so handlers never walk the raw YAML dict.
+    """
+    defaults = dynalite_map.get("defaults", {}) or {}
+    channels = {}
+    children = {}
+    nearest_cache = {}   # dropped with the compile, so old configs' tables do not pile up
+
+    for area_id, area_cfg in (dynalite_map.get("areas", {}) or {}).items():
+        try:
+            area = int(area_id)
+        except (TypeError, ValueError):
+            log("⚠️ Skipping non-numeric area id %r", area_id, level=WARNING)
+            continue
+
+        area_children = []
+        for ch_id, ch_cfg in ((area_cfg or {}).get("channels", {}) or {}).items():
+            ch_str = str(ch_id)
+            entry = _build_entry(area, ch_str, ch_cfg or {}, defaults, nearest_cache)
+            channels[(area, ch_str)] = entry
+            if ch_str.isdigit():
+                channels[(area, int(ch_str))] = entry
+            if ch_str != "all":
+                area_children.append(entry)
+        children[area] = tuple(area_children)
+
+    return DynaliteIndex(
+        channels=MappingProxyType(channels),
+        children=MappingProxyType(children),
+        defaults=_build_entry(None, None, {}, defaults, nearest_cache, mapped=False)
+    )
+
+
+def get_dynalite_index(dynalite_map: dict) -> DynaliteIndex:
+    index = dynalite_map.get(INDEX_KEY)
+    if index is None:
+        index = compile_dynalite_index(dynalite_map)
+        dynalite_map[INDEX_KEY] = index
+    return index
+
 
 def load_dynalite_config(path):
     try:
@@ -9,14 +138,15 @@ def load_dynalite_config(path):
         f.close()
         log("✅ Loaded Dynalite config")
         if not isinstance(dynalite_map, dict):
-            log("⚠️ Config is not a dictionary")
+            log("⚠️ Config is not a dictionary", level=WARNING)
             return {}
 
         if "areas" not in dynalite_map:
-            log("⚠️ Config missing 'areas' key")
+            log("⚠️ Config missing 'areas' key", level=WARNING)
 
+        dynalite_map[INDEX_KEY] = compile_dynalite_index(dynalite_map)
         return dynalite_map
 
     except Exception as e:
-        log(f"❌ Failed to load Dynalite config: {e}")
+        log("❌ Failed to load Dynalite config: %s", e, level=ERROR)
         return {}
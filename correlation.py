@@ -0,0 +1,49 @@
+# correlation.py
+# Response IDs correlating frames sent on {prefix}/set with acks on {prefix}/set/res/<id>
+import itertools
+import time
+import uuid
+from config import RESPONSE_ID_MODE
+
+_BASE36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+EPOCH_WIDTH = 8  # ms since 1970 fits 8 base-36 digits until the year 2059
+
+
+def to_base36(value: int) -> str:
+    if value == 0:
+        return "0"
+    digits = []
+    while value:
+        value, rem = divmod(value, 36)
+        digits.append(_BASE36[rem])
+    return "".join(reversed(digits))
+
+
+class CounterIdGenerator:
+    """
+    Short IDs: a fixed-width per-process epoch (start time in ms, base 36)
+    followed by a base-36 counter, e.g. "mg6x1k2a" + "1f". No syscall or
+    random bytes per call, and the epoch keeps IDs unique across restarts.
+    """
+
+    def __init__(self, epoch_ms: int = None):
+        if epoch_ms is None:
+            epoch_ms = time.time_ns() // 1_000_000
+        self.prefix = to_base36(epoch_ms).rjust(EPOCH_WIDTH, "0")
+        self._counter = itertools.count(1)  # next() is atomic under the GIL
+
+    def __call__(self) -> str:
+        return self.prefix + to_base36(next(self._counter))
+
+
+def uuid_id() -> str:
+    return uuid.uuid4().hex
+
+
+def make_id_generator(mode: str = RESPONSE_ID_MODE):
+    if mode == "uuid":
+        return uuid_id
+    return CounterIdGenerator()
+
+
+new_response_id = make_id_generator()
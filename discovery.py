@@ -1,59 +1,152 @@
 # discovery.py
+import hashlib
 import json
+from typing import NamedTuple
 from config import SW_VER, MQTT_HOMEASSISTANT_PREFIX, PUBLISHER
-from utils import log
+from state_cache import state_cache
+from utils import log, ERROR
 
 
-def publish_light_discovery(mqtt_client, dynalite_map):
+class DiscoveryEntry(NamedTuple):
+    source: tuple    # (area name, channel config, default style) the payload was built from
+    topic: str
+    payload: bytes   # pre-serialized retained config
+    digest: bytes
+    name: str
+
+
+_entity_cache = {}   # (area_id, channel) -> DiscoveryEntry, survives reloads and reconnects
+_published = {}      # (area_id, channel) -> (topic, digest) last sent to the broker
+stats = {"built": 0, "reused": 0}
+
+
+def _build_entry(area_id, area_name, channel_str, light, style, source):
+    uid = f"dynet_area_{area_id}"
+    light_name = light.get("name", f"Light {channel_str}")
+    l_uid = f"channel_{channel_str}"
+    base_topic = f"{MQTT_HOMEASSISTANT_PREFIX}/light/{uid}/{l_uid}"
+    topic = f"{base_topic}/config"
+
+    payload = {
+        "platform": "light",
+        "name": light_name,
+        "unique_id": f"{uid}_{l_uid}",
+        "availability_topic": "bridges/light_dynalite/status",
+        "retain": False,
+        "icon": light.get("icon", "mdi:lightbulb"),
+        "device": {
+            "identifiers": [uid],
+            "name": f"Area {area_id} - {area_name}",
+            "manufacturer": PUBLISHER,
+            "model": "Philips Dynalite MQTT Bridge",
+            "sw_version": f"{SW_VER}"
+        }
+    }
+
+    if style.lower() == "dimmable":
+        payload.update({
+            "brightness_state_topic": f"{base_topic}/brightness",
+            "brightness_command_topic": f"{base_topic}/brightness/set",
+            "brightness_value_template": "{{ value | int }}",
+            "state_topic": f"{base_topic}/brightness",
+            "state_value_template": "{{ 'ON' if value | int > 0 else 0 }}",
+            "command_topic": f"{base_topic}/brightness/set",
+            "on_command_type": "brightness",
+            "payload_off": 0
+        })
+
+    data = json.dumps(payload).encode()
+    return DiscoveryEntry(source, topic, data, hashlib.blake2b(data, digest_size=16).digest(), light_name)
+
+
+def build_light_discovery(dynalite_map):
+    """
+    Discovery entities for every mapped channel: {(area_id, channel): DiscoveryEntry}.
+    An entity is only re-serialized when its source config entry changed.
+    """
+    entities = {}
+    default_style = dynalite_map.get("defaults", {}).get("light_style", "dimmable")
     for area_id, area_cfg in dynalite_map.get("areas", {}).items():
         try:
             area_name = area_cfg.get("name", f"Area {area_id}")
-            uid = f"dynet_area_{area_id}"
-            device_id = {
-                "device": {
-                    "identifiers": [uid],
-                    "name": f"Area {area_id} - {area_name}",
-                    "manufacturer": PUBLISHER,
-                    "model": "Philips Dynalite MQTT Bridge",
-                    "sw_version": f"{SW_VER}"
-                }
-            }
-
             for channel_str, light in area_cfg.get("channels", {}).items():
+                key = (area_id, str(channel_str))
                 try:
-                    light_name = light.get("name", f"Light {channel_str}")
-                    style = light.get("style", dynalite_map.get("defaults", {}).get("light_style", "dimmable"))
-                    l_uid = f"channel_{channel_str}"
-                    base_topic = f"{MQTT_HOMEASSISTANT_PREFIX}/light/{uid}/{l_uid}"
-                    topic = f"{base_topic}/config"
-
-                    payload = {
-                        "platform": "light",
-                        "name": light_name,
-                        "unique_id": f"{uid}_{l_uid}",
-                        "availability_topic": "bridges/light_dynalite/status",
-                        "retain": False,
-                        "icon": light.get("icon", "mdi:lightbulb")
-                    }
-                    payload.update(device_id)
-
-                    if style.lower() == "dimmable":
-                        payload.update({
-                            "brightness_state_topic": f"{base_topic}/brightness",
-                            "brightness_command_topic": f"{base_topic}/brightness/set",
-                            "brightness_value_template": "{{ value | int }}",
-                            "state_topic": f"{base_topic}/brightness",
-                            "state_value_template": "{{ 'ON' if value | int > 0 else 0 }}",
-                            "command_topic": f"{base_topic}/brightness/set",
-                            "on_command_type": "brightness",
-                            "payload_off": 0
-                        })
-
-                    mqtt_client.publish(topic, json.dumps(payload), retain=True)
-                    log(f"📡 Published light discovery → {payload['name']}")
+                    light = light or {}
+                    style = light.get("style", default_style)
+                    source = (area_name, light, style)
+                    cached = _entity_cache.get(key)
+                    if cached is not None and cached.source == source:
+                        entities[key] = cached
+                        stats["reused"] += 1
+                        continue
+                    entry = _build_entry(area_id, area_name, key[1], light, style,
+                                         (area_name, dict(light), style))
+                    _entity_cache[key] = entities[key] = entry
+                    stats["built"] += 1
 
                 except Exception as e:
-                    log(f"❌ Failed to publish light #{channel_str} in area {area_id}: {e}")
+                    log("❌ Failed to build light #%s in area %s: %s", channel_str, area_id, e,
+                        level=ERROR, area=area_id, channel=channel_str)
 
         except Exception as e:
-            log(f"❌ Failed to process area {area_id}: {e}")
+            log("❌ Failed to process area %s: %s", area_id, e, level=ERROR, area=area_id)
+
+    for key in set(_entity_cache) - set(entities):
+        del _entity_cache[key]
+    return entities
+
+
+def published_discovery():
+    """(topic, payload bytes) for every entity currently published, straight from the cache."""
+    return [(entry.topic, entry.payload)
+            for key, entry in list(_entity_cache.items()) if key in _published]
+
+
+def publish_light_discovery(mqtt_client, dynalite_map, incremental=False):
+    """
+    Publish retained discovery config. When `incremental`, only entities whose
+    payload differs from what was last published are sent, and entities that
+    disappeared from the map get an empty retained payload so Home Assistant drops them.
+
+    Returns:
+        dict: counts of added / changed / removed / unchanged entities
+    """
+    entities = build_light_discovery(dynalite_map)
+    report = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+
+    for key, entry in entities.items():
+        old = _published.get(key)
+        if incremental and old == (entry.topic, entry.digest):
+            report["unchanged"] += 1
+            continue
+        try:
+            if not mqtt_client.publish(entry.topic, entry.payload, retain=True):
+                raise RuntimeError("publish rejected")
+            _published[key] = (entry.topic, entry.digest)
+            report["added" if old is None else "changed"] += 1
+            log(f"📡 Published light discovery → {entry.name}")
+        except Exception as e:
+            log("❌ Failed to publish light #%s in area %s: %s", key[1], key[0], e,
+                level=ERROR, area=key[0], channel=key[1])
+
+    for key in [k for k in _published if k not in entities]:
+        topic = _published[key][0]
+        state_topic = topic[:-len("/config")] + "/brightness"
+        try:
+            # clear the retained config and state; kept in _published for a retry if that fails
+            if not mqtt_client.publish(topic, "", retain=True):
+                raise RuntimeError("publish rejected")
+            del _published[key]
+            mqtt_client.enqueue(state_topic, "", retain=True)   # replaces a state still in the queue
+            state_cache.forget(state_topic)
+            report["removed"] += 1
+            log(f"🗑️ Removed light discovery → area {key[0]} channel {key[1]}")
+        except Exception as e:
+            log("❌ Failed to remove light #%s in area %s: %s", key[1], key[0], e,
+                level=ERROR, area=key[0], channel=key[1])
+
+    touched = report["added"] + report["changed"] + report["removed"]
+    log(f"📡 Discovery: {touched} entities touched "
+        f"(+{report['added']} ~{report['changed']} -{report['removed']}, {report['unchanged']} unchanged)")
+    return report
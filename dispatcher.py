@@ -0,0 +1,88 @@
+# dispatcher.py
+# Hands inbound messages to a bounded pool of worker threads, so a slow handler
+# (e.g. a large "all" fan-out) does not hold up the MQTT network loop.
+import queue
+import threading
+import time
+from metrics import registry, HANDLER_SECONDS
+from utils import log, WARNING, ERROR
+
+DISPATCH_WAIT = registry.histogram(
+    "dynalite_dispatch_wait_seconds", "Time messages wait for a dispatch worker")
+DISPATCH_DROPPED = registry.counter(
+    "dynalite_dispatch_dropped_total", "Messages dropped because a dispatch queue stayed full")
+
+
+class KeyedDispatcher:
+    """
+    Each key is pinned to one worker (by hash), so messages with the same key
+    run in arrival order while different keys run in parallel.
+
+    When a worker's queue is full, submit() blocks the caller for up to
+    `block_timeout` seconds. That slows reads from the broker and pushes back
+    on it. If the queue is still full after that, the message is dropped and counted.
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 1000, block_timeout: float = 0.5):
+        self.block_timeout = block_timeout
+        self._queues = [queue.Queue(maxsize=max_queue) for _ in range(workers)]
+        self._busy = [0.0] * workers   # handler seconds per worker
+        self.submitted = 0
+        self.dropped = 0
+        self.blocked = 0
+        self._threads = []
+        for idx, q in enumerate(self._queues):
+            thread = threading.Thread(target=self._work, args=(idx, q), name=f"dispatch-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, name, func, *args) -> bool:
+        # only the MQTT network loop submits, so the counters below have a single writer
+        q = self._queues[hash(key) % len(self._queues)]
+        item = (time.perf_counter(), name, func, args)
+        self.submitted += 1
+        try:
+            q.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        self.blocked += 1
+        try:
+            q.put(item, timeout=self.block_timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            DISPATCH_DROPPED.inc()
+            log("⚠️ Dispatch queue full — dropped %s message", name, level=WARNING)
+            return False
+
+    def _work(self, idx, q):
+        while True:
+            queued, name, func, args = q.get()
+            started = time.perf_counter()
+            DISPATCH_WAIT.observe(started - queued)
+            try:
+                func(*args)
+            except Exception as e:
+                log("❌ Error in %s handler: %s", name, e, level=ERROR)
+            finally:
+                elapsed = time.perf_counter() - started
+                self._busy[idx] += elapsed
+                HANDLER_SECONDS.observe(elapsed, name)
+                q.task_done()
+
+    def depths(self) -> dict:
+        return {str(idx): q.qsize() for idx, q in enumerate(self._queues)}
+
+    def idle(self) -> bool:
+        return all(q.unfinished_tasks == 0 for q in self._queues)
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._queues),
+            "depth": sum(q.qsize() for q in self._queues),
+            "submitted": self.submitted,
+            "blocked": self.blocked,
+            "dropped": self.dropped,
+            "busy_seconds": dict(enumerate(self._busy))
+        }
@@ -0,0 +1,86 @@
+# dynet_ingest.py
+# Raw Dynet frame ingest: classify on opcode through a jump table instead of
+# json.loads + description matching + field_types scans.
+from helpers.dynet_frame import DynetFrame, DYNET1_SYNC, DYNET2_OPCODES
+from message_handlers import publish_preset_state
+from utils import log, ERROR
+
+DYNET1_HANDLERS = [None] * 256
+DYNET2_HANDLERS = [None] * 256
+
+
+def _channel_str(zero_based: int) -> str:
+    return "all" if zero_based == 0xFF else str(zero_based + 1)
+
+
+def _dyn1_area_preset(frame, dynalite_map, mqtt_client):
+    # 0x00-0x03 → presets 1-4, 0x0A-0x0D → presets 5-8, data3 selects the bank of 8
+    data = frame.data
+    opcode = data[3]
+    base = opcode + 1 if opcode <= 0x03 else opcode - 0x0A + 5
+    publish_preset_state(data[1], "all", base + data[5] * 8, dynalite_map, mqtt_client)
+
+
+def _dyn1_linear_preset(frame, dynalite_map, mqtt_client):
+    # 0x65: data1 = preset (zero based)
+    data = frame.data
+    publish_preset_state(data[1], "all", data[2] + 1, dynalite_map, mqtt_client)
+
+
+def _dyn1_reply_current_preset(frame, dynalite_map, mqtt_client):
+    # 0x62: data1 = preset (zero based), data2 = channel as sent in the 0x63 request
+    data = frame.data
+    publish_preset_state(data[1], _channel_str(data[4]), data[2] + 1, dynalite_map, mqtt_client, reply=True)
+
+
+def _dyn1_channel_preset(frame, dynalite_map, mqtt_client):
+    # 0x6B: data1 = channel (zero based, 0xFF = all), data2 = preset (zero based)
+    data = frame.data
+    publish_preset_state(data[1], _channel_str(data[2]), data[4] + 1, dynalite_map, mqtt_client)
+
+
+def _dyn2_preset(frame, dynalite_map, mqtt_client):
+    # 0x11: opcode, device, box, area, join, 0x00, channel, preset, fade, 0x00
+    fields = frame.fields()
+    channel = fields[6]
+    publish_preset_state(fields[3], "all" if channel in (0xFF, 0xFFFF) else str(channel),
+                         fields[7], dynalite_map, mqtt_client)
+
+
+for _opcode in (0x00, 0x01, 0x02, 0x03, 0x0A, 0x0B, 0x0C, 0x0D):
+    DYNET1_HANDLERS[_opcode] = _dyn1_area_preset
+DYNET1_HANDLERS[0x62] = _dyn1_reply_current_preset
+DYNET1_HANDLERS[0x65] = _dyn1_linear_preset
+DYNET1_HANDLERS[0x6B] = _dyn1_channel_preset
+DYNET2_HANDLERS[0x11] = _dyn2_preset
+
+
+def decode_raw_payload(payload) -> DynetFrame:
+    """Accept a binary frame or its hex text ("1C 0D 00 ..." / "1c0d00...")."""
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        # hex text always starts with an ASCII digit/letter, never a sync byte or Dynet2 opcode
+        if len(payload) and (payload[0] == DYNET1_SYNC or payload[0] in DYNET2_OPCODES):
+            return DynetFrame.decode(payload)
+        try:
+            payload = bytes(payload).decode("ascii")
+        except UnicodeDecodeError:
+            return DynetFrame.decode(payload)
+    return DynetFrame.decode(bytes.fromhex(payload))
+
+
+def handle_raw_frame(payload, dynalite_map, mqtt_client):
+    """`payload` is the MQTT payload, or a DynetFrame already decoded from it."""
+    try:
+        frame = payload if isinstance(payload, DynetFrame) else decode_raw_payload(payload)
+    except ValueError as e:
+        log("❌ Invalid raw Dynet frame: %s", e, level=ERROR)
+        return
+
+    table = DYNET1_HANDLERS if frame.type == "dynet1" else DYNET2_HANDLERS
+    handler = table[frame.opcode]
+    if handler is None:
+        return
+    try:
+        handler(frame, dynalite_map, mqtt_client)
+    except Exception as e:
+        log("❌ Failed to handle raw Dynet frame %s: %s", frame.hex_string, e, level=ERROR, area=frame.area)
@@ -0,0 +1,126 @@
+# gateways.py
+# The Dynet gateways (PDEG / IP bridges) the bridge talks to and the areas each
+# one owns. Areas not assigned in dynalite_map.yaml go to the default gateway
+# configured through MQTT_DYNALITE_PREFIX.
+#
+#   gateways:
+#     north:
+#       prefix: dynalite/north     # topic prefix: <prefix>, <prefix>/set, <prefix>/set/res/<id>
+#       areas: [10, 13, 14]
+#       will: dynalite/north/status   # optional, default <prefix>/status
+#       raw_topic: dynalite/north/raw # optional, default <prefix>/raw
+#       bus_rate: 40                  # optional frames/s, default DYNET_BUS_RATE
+from config import (
+    MQTT_DYNALITE_PREFIX, MQTT_DYNALITE_WILL, MQTT_DYNALITE_RAW_TOPIC, DYNET_INGEST
+)
+from utils import log, WARNING, ERROR
+
+DEFAULT_GATEWAY = "default"
+
+
+class Gateway:
+    __slots__ = ("name", "prefix", "will_topic", "raw_topic", "bus_rate", "scheduler", "online")
+
+    def __init__(self, name, prefix, will_topic, raw_topic, bus_rate):
+        self.name = name
+        self.prefix = prefix
+        self.will_topic = will_topic
+        self.raw_topic = raw_topic
+        self.bus_rate = bus_rate
+        self.scheduler = None   # DynetBusScheduler, one per gateway so each bus is paced on its own
+        self.online = False
+
+    @property
+    def set_topic(self) -> str:
+        return f"{self.prefix}/set"
+
+    def topics(self) -> tuple:
+        """Topics the bridge subscribes to for this gateway."""
+        return (self.will_topic, f"{self.prefix}/set/res/#",
+                self.raw_topic if DYNET_INGEST == "raw" else self.prefix)
+
+    def spec(self) -> tuple:
+        return (self.prefix, self.will_topic, self.raw_topic, self.bus_rate)
+
+
+def _parse_areas(value) -> set:
+    """Area list from yaml: ints, "20-29" ranges, or a mix."""
+    areas = set()
+    for item in value if isinstance(value, (list, tuple)) else [value]:
+        text = str(item)
+        if "-" in text:
+            first, last = text.split("-", 1)
+            areas.update(range(int(first), int(last) + 1))
+        else:
+            areas.add(int(text))
+    return areas
+
+
+class GatewayTable:
+    def __init__(self, bus_rate: float = 0):
+        self.bus_rate = bus_rate
+        default = Gateway(DEFAULT_GATEWAY, MQTT_DYNALITE_PREFIX, MQTT_DYNALITE_WILL, MQTT_DYNALITE_RAW_TOPIC, bus_rate)
+        self.default = default
+        self.gateways = {DEFAULT_GATEWAY: default}
+        self.by_area = {}   # area -> Gateway, only for areas not on the default gateway
+
+    def __iter__(self):
+        return iter(list(self.gateways.values()))
+
+    def for_area(self, area) -> Gateway:
+        return self.by_area.get(area, self.default)
+
+    def raw_topics(self) -> frozenset:
+        return frozenset(gw.raw_topic for gw in self) if DYNET_INGEST == "raw" else frozenset()
+
+    def online(self) -> dict:
+        return {gw.name: gw.online for gw in self}
+
+    def configure(self, dynalite_map, make_scheduler):
+        """
+        Apply the `gateways:` section. Gateways whose topics did not change keep
+        their scheduler and online state.
+
+        Returns:
+            tuple: (added gateways, removed gateways)
+        """
+        specs = {}
+        by_area = {}
+        for name, cfg in (dynalite_map.get("gateways") or {}).items():
+            name = str(name)
+            try:
+                cfg = cfg or {}
+                prefix = str(cfg.get("prefix", MQTT_DYNALITE_PREFIX if name == DEFAULT_GATEWAY else name)).rstrip("/")
+                specs[name] = (prefix,
+                               cfg.get("will", f"{prefix}/status"),
+                               cfg.get("raw_topic", f"{prefix}/raw"),
+                               float(cfg.get("bus_rate", self.bus_rate)))
+                for area in _parse_areas(cfg.get("areas", [])):
+                    if area in by_area:
+                        log("⚠️ Area %s assigned to gateways %s and %s — using %s", area, by_area[area], name, name, level=WARNING)
+                    by_area[area] = name
+            except Exception as e:
+                log("❌ Failed to read gateway %s: %s", name, e, level=ERROR)
+                specs.pop(name, None)
+        if DEFAULT_GATEWAY not in specs:
+            specs[DEFAULT_GATEWAY] = (MQTT_DYNALITE_PREFIX, MQTT_DYNALITE_WILL, MQTT_DYNALITE_RAW_TOPIC, self.bus_rate)
+
+        added, removed = [], []
+        for name, gw in list(self.gateways.items()):
+            if specs.get(name) != gw.spec():
+                removed.append(self.gateways.pop(name))
+        for name, spec in specs.items():
+            gw = self.gateways.get(name)
+            if gw is None:
+                gw = self.gateways[name] = Gateway(name, *spec)
+                added.append(gw)
+            if gw.scheduler is None:
+                gw.scheduler = make_scheduler(gw.bus_rate)
+
+        self.default = self.gateways[DEFAULT_GATEWAY]
+        self.by_area = {area: self.gateways[name] for area, name in by_area.items()
+                        if name != DEFAULT_GATEWAY and name in self.gateways}
+        if added or removed or len(self.gateways) > 1:
+            log(f"🔀 Gateways: {', '.join(f'{gw.name} ({gw.prefix})' for gw in self)}; "
+                f"{len(self.by_area)} areas assigned away from {self.default.prefix}")
+        return added, removed
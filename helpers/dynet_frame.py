@@ -0,0 +1,167 @@
+import struct
+
+DYNET1_SYNC = 0x1C
+DYNET1_LEN = 8
+
+# Dynet1: sync, area, data1, opcode, data2, data3, join, checksum
+_DYNET1 = struct.Struct(">8B")
+_DYNET1_BODY = struct.Struct(">7B")
+
+# Dynet2 message bodies as consumed by the gateway (it adds the 0xAC header and CRC)
+_DYNET2_LAYOUTS = {
+    # 0x10 set channel level: opcode, device, box, area, join, 0x02, channel, level, 0x00, fade hi, fade lo16, 0x00
+    0x10: struct.Struct(">BBHHBBHBBBHB"),
+    # 0x11 fade channel/area to preset: opcode, device, box, area, join, 0x00, channel, preset, fade hi, fade lo16, 0x00
+    0x11: struct.Struct(">BBHHBBHHBHB"),
+}
+DYNET2_OPCODES = frozenset(_DYNET2_LAYOUTS)
+
+
+def dynet1_checksum(body) -> int:
+    """Two's complement of the byte sum, so the whole 8-byte frame sums to 0."""
+    return -sum(body) & 0xFF
+
+
+def encode_dynet1_into(buf, offset: int, area: int, data1: int, opcode: int,
+                       data2: int, data3: int, join: int = 0xFF) -> int:
+    """
+    Pack a complete Dynet1 frame into `buf` (bytearray/memoryview) without allocating.
+
+    Returns:
+        int: offset just past the frame
+    """
+    area &= 0xFF
+    data1 &= 0xFF
+    opcode &= 0xFF
+    data2 &= 0xFF
+    data3 &= 0xFF
+    join &= 0xFF
+    checksum = -(DYNET1_SYNC + area + data1 + opcode + data2 + data3 + join) & 0xFF
+    _DYNET1.pack_into(buf, offset, DYNET1_SYNC, area, data1, opcode, data2, data3, join, checksum)
+    return offset + DYNET1_LEN
+
+
+class DynetFrame:
+    """
+    Dynet1/Dynet2 frame held as bytes.
+
+    `hex_string` is the gateway form ("1C 0D 00 6B 00 00 FF" - Dynet1 without
+    checksum, Dynet2 body) and is only produced when first asked for.
+    """
+
+    __slots__ = ("type", "data", "_hex")
+
+    def __init__(self, type: str, data):
+        self.type = type
+        self.data = data
+        self._hex = None
+
+    def __bytes__(self):
+        return bytes(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __eq__(self, other):
+        return isinstance(other, DynetFrame) and self.type == other.type and bytes(self.data) == bytes(other.data)
+
+    def __repr__(self):
+        return f"DynetFrame({self.type}, {self.hex_string})"
+
+    @property
+    def hex_string(self) -> str:
+        if self._hex is None:
+            body = self.data[:DYNET1_LEN - 1] if self.type == "dynet1" else self.data
+            self._hex = bytes(body).hex(" ").upper()
+        return self._hex
+
+    @property
+    def opcode(self) -> int:
+        return self.data[3] if self.type == "dynet1" else self.data[0]
+
+    @property
+    def area(self) -> int:
+        if self.type == "dynet1":
+            return self.data[1]
+        return (self.data[4] << 8) | self.data[5]
+
+    def fields(self) -> tuple:
+        """Unpack the frame using its struct layout (Dynet1: sync..checksum)."""
+        if self.type == "dynet1":
+            return _DYNET1.unpack_from(self.data)
+        return _DYNET2_LAYOUTS[self.data[0]].unpack_from(self.data)
+
+    # --- encoders --------------------------------------------------------------
+
+    @classmethod
+    def dynet1(cls, area: int, data1: int, opcode: int, data2: int = 0, data3: int = 0, join: int = 0xFF):
+        buf = bytearray(DYNET1_LEN)
+        encode_dynet1_into(buf, 0, area, data1, opcode, data2, data3, join)
+        return cls("dynet1", buf)
+
+    @classmethod
+    def set_preset_dyn1(cls, area: int, preset: int, channel: int = 0x00, fade_time: float = 0., join: int = 0xFF):
+        """Opcode 0x6B, same argument semantics as build_request_set_preset_dyn1."""
+        if channel != 0xFF:
+            channel = max(0, channel - 1)
+        fade = min(int(fade_time / 0.02), 0xFF)
+        return cls.dynet1(area, channel, 0x6B, max(0, preset - 1), fade, join)
+
+    @classmethod
+    def request_current_preset(cls, area: int, join: int = 0xFF, channel: int = 0x00):
+        """Opcode 0x63, same argument semantics as build_request_current_preset."""
+        if channel != 0xFF:
+            channel = max(0, channel - 1)
+        return cls.dynet1(area, 0x00, 0x63, channel, 0x00, join)
+
+    @classmethod
+    def area_preset_dyn2(cls, area: int, preset: int, fade: int = 50, channel: int = 0xFFFF,
+                         join: int = 0xFF, device: int = 0xBB, box: int = 8):
+        """Dynet2 opcode 0x11, same layout as build_area_preset_body."""
+        buf = bytearray(_DYNET2_LAYOUTS[0x11].size)
+        _DYNET2_LAYOUTS[0x11].pack_into(
+            buf, 0, 0x11, device & 0xFF, box & 0xFFFF, area & 0xFFFF, join & 0xFF, 0x00,
+            channel & 0xFFFF, preset & 0xFFFF, (fade >> 16) & 0xFF, fade & 0xFFFF, 0x00)
+        return cls("dynet2", buf)
+
+    @classmethod
+    def channel_level_dyn2(cls, area: int, channel: int, level: int, join: int, fade: int = 50,
+                           device: int = 0xBB, box: int = 8):
+        """Dynet2 opcode 0x10, same layout as build_channel_level_body (level is 0-254, not a percent)."""
+        buf = bytearray(_DYNET2_LAYOUTS[0x10].size)
+        _DYNET2_LAYOUTS[0x10].pack_into(
+            buf, 0, 0x10, device & 0xFF, box & 0xFFFF, area & 0xFFFF, join & 0xFF, 0x02,
+            channel & 0xFFFF, level & 0xFF, 0x00, (fade >> 16) & 0xFF, fade & 0xFFFF, 0x00)
+        return cls("dynet2", buf)
+
+    # --- decoders --------------------------------------------------------------
+
+    @classmethod
+    def decode(cls, data, check: bool = True):
+        """
+        Decode a raw frame from bytes/bytearray/memoryview without copying.
+        An 8-byte frame starting with 0x1C is Dynet1 (checksum verified when `check`);
+        a known Dynet2 body is recognised by its opcode and length.
+
+        Raises:
+            ValueError: unknown layout or bad checksum
+        """
+        view = memoryview(data)
+        if len(view) == DYNET1_LEN and view[0] == DYNET1_SYNC:
+            if check and sum(view) & 0xFF:
+                raise ValueError("Dynet1 checksum mismatch")
+            return cls("dynet1", view)
+        if len(view) == DYNET1_LEN - 1 and view[0] == DYNET1_SYNC:
+            # gateway form without checksum
+            buf = bytearray(DYNET1_LEN)
+            buf[:DYNET1_LEN - 1] = view
+            buf[DYNET1_LEN - 1] = dynet1_checksum(view)
+            return cls("dynet1", buf)
+        layout = _DYNET2_LAYOUTS.get(view[0]) if len(view) else None
+        if layout is not None and len(view) == layout.size:
+            return cls("dynet2", view)
+        raise ValueError(f"Unknown Dynet frame ({len(view)} bytes)")
+
+    @classmethod
+    def from_hex(cls, hex_string: str, check: bool = True):
+        return cls.decode(bytes.fromhex(hex_string), check=check)
@@ -1,5 +1,4 @@
-from datetime import datetime
-def log(msg): print(f"{datetime.now().strftime('%H:%M:%S')} 🧠 {msg}")
+from utils import log, ERROR
 
 def float_to_q7_8(temp: float) -> tuple[int, int]:
     try:
@@ -7,7 +6,7 @@ def float_to_q7_8(temp: float) -> tuple[int, int]:
         raw = int(temp * 256)
         return (raw >> 8) & 0xFF, raw & 0xFF
     except Exception as e:
-        log(f"❌ float_to_q7_8 error: {e}")
+        log("❌ float_to_q7_8 error: %s", e, level=ERROR)
         return 0, 0
 
 
@@ -18,7 +17,7 @@ def float_to_dynet_decimal(temp: float) -> tuple[int, int]:
         decimal_part = int(round((temp - int_part) * 100))
         return int_part & 0xFF, decimal_part & 0xFF
     except Exception as e:
-        log(f"❌ float_to_dynet_decimal error: {e}")
+        log("❌ float_to_dynet_decimal error: %s", e, level=ERROR)
         return 0, 0
 
 
@@ -42,7 +41,7 @@ def build_area_setpoint_body(area: int, join: int, setpoint: float, device=0xBB,
         return " ".join(f"{b:02X}" for b in body_bytes)
 
     except Exception as e:
-        log(f"❌ build_area_setpoint_body error: {e}")
+        log("❌ build_area_setpoint_body error: %s", e, level=ERROR)
         return None
 
 
@@ -66,7 +65,7 @@ def build_area_temperature_body(area: int, join: int, temp: float, device=0xBB,
         return " ".join(f"{b:02X}" for b in body_bytes)
 
     except Exception as e:
-        log(f"❌ build_area_temperature_body error: {e}")
+        log("❌ build_area_temperature_body error: %s", e, level=ERROR)
         return None
 
 
@@ -105,7 +104,7 @@ def build_area_preset_body(area: int, preset: int, fade: int =50, channel: int =
             ]
         return " ".join(f"{b:02X}" for b in body_bytes)
     except Exception as e:
-        log(f"❌ build_area_preset_body error: {e}")
+        log("❌ build_area_preset_body error: %s", e, level=ERROR)
         return None
 
 def percent_to_dynet_level(percent: int) -> int:
@@ -115,7 +114,7 @@ def percent_to_dynet_level(percent: int) -> int:
         percent = max(0, min(int(percent), 100))
         return int(percent / 100 * 254)
     except Exception as e:
-        log(f"❌ percent_to_dynet_level error: {e}")
+        log("❌ percent_to_dynet_level error: %s", e, level=ERROR)
         return 0
 
 
@@ -148,7 +147,7 @@ def build_channel_level_body(area: int, channel: int, level: int,join: int, fade
         return " ".join(f"{b:02X}" for b in body_bytes)
 
     except Exception as e:
-        log(f"❌ build_channel_level_body error: {e}")
+        log("❌ build_channel_level_body error: %s", e, level=ERROR)
         return None
 
 
@@ -180,7 +179,7 @@ def build_request_current_preset(area: int, join: int = 0xFF, channel: int = 0x0
         return " ".join(f"{b:02X}" for b in body_bytes)
 
     except Exception as e:
-        log(f"❌ build_channel_level_body error: {e}")
+        log("❌ build_channel_level_body error: %s", e, level=ERROR)
         return None
     
 
@@ -220,7 +219,7 @@ def build_request_set_preset_dyn1(area: int, preset: int, channel: int = 0x00, f
         return " ".join(f"{b:02X}" for b in body_bytes)
 
     except Exception as e:
-        log(f"❌ build_request_set_preset_dyn1: {e}")
+        log("❌ build_request_set_preset_dyn1: %s", e, level=ERROR)
         return None
 
 
@@ -274,5 +273,5 @@ def build_request_ramp_dyn1(area: int, direction: int = 2, channel: int = 0x00,
         return " ".join(f"{b:02X}" for b in body_bytes)
 
     except Exception as e:
-        log(f"❌ build_request_set_preset_dyn1: {e}")
+        log("❌ build_request_set_preset_dyn1: %s", e, level=ERROR)
         return None
@@ -2,9 +2,25 @@
 import asyncio
 import json
 from config_loader import load_dynalite_config
-from mqtt_handlers import start_mqtt, sweep_pending_responses
-from utils import log
+from mqtt_handlers import start_mqtt, sweep_pending_responses, configure_gateways, gateways
+from utils import log, get_val_by_mestype, WARNING, ERROR
+from state_cache import seed_from_retained
+from dynet_ingest import handle_raw_frame, decode_raw_payload
+from pending_responses import PendingResponses
+from sync_sweep import sync_sweep_loop
+from state_store import state_store, restore_states, flush_state_store
+from tracing import tracer, trace_dump_loop
 from webui import init_web_ui, run_web_ui
+from metrics import registry, CallbackHistogram
+from topic_router import TopicRouter, prefixed_int, prefixed_channel, any_level
+from dispatcher import KeyedDispatcher
+from pending_responses import LATENCY_BUCKETS
+from state_cache import state_cache
+from command_debouncer import command_debouncer
+from scene_planner import scene_planner
+import discovery
+import recovery
+import sync_sweep
 
 from discovery import publish_light_discovery
 from message_handlers import (
@@ -14,53 +30,220 @@ from message_handlers import (
 )
 
 from config import (
-     MQTT_DYNALITE_PREFIX, MQTT_DYNALITE_WILL, CONFIG_PORT, CONFIG_PATH
+     MQTT_HOMEASSISTANT_PREFIX,
+     CONFIG_PORT, CONFIG_PATH, RESPONSE_TTL,
+     SYNC_ON_START, SYNC_START_DELAY, SYNC_INTERVAL, TRACE_DUMP_PATH,
+     DISPATCH_WORKERS, DISPATCH_QUEUE_MAX, DISPATCH_BLOCK_MS
 )
 
 
-bridge_online = {"dynalite": False} # Track bridge status
 dynalite_map = {}  # Global map, shared across modules
 mqtt_client = None  # Global MQTT client
-pending_responses = {} #Response tracker
+pending_responses = PendingResponses(ttl=RESPONSE_TTL) #Response tracker
+dispatcher = None  # worker pool for inbound messages, started in main()
 
 def reload_dynalite_config():
     global dynalite_map
-    dynalite_map = load_dynalite_config(CONFIG_PATH)
-    log("🔄 Dynalite config reloaded.")
-    publish_light_discovery(mqtt_client, dynalite_map)
+    global router
+    new_map = load_dynalite_config(CONFIG_PATH)
+    if not new_map and dynalite_map:
+        log("⚠️ Reloaded config is empty — keeping the previous map", level=WARNING)
+        return
+    dynalite_map = new_map
     log("🔄 Dynalite config reloaded.")
+    if configure_gateways(dynalite_map):
+        router = build_router()
+    # only republish what changed since the previous map
+    publish_light_discovery(mqtt_client, dynalite_map, incremental=True)
 
 
-def mqtt_callback(topic, payload):
-    global pending_responses
-    if topic.startswith("homeassistant/light/dynet_area_") and topic.endswith("/brightness/set"):
-        handle_ha_brightness_command(topic, payload, dynalite_map,mqtt_client,pending_responses)
-    elif topic == MQTT_DYNALITE_PREFIX:
-        try:
-            parsed = json.loads(payload)
-            handle_dynet_packet(parsed, dynalite_map,mqtt_client)
-        except Exception as e:
-            log(f"❌ Invalid Dynalite JSON: {e}")
-    elif topic.startswith(f"{MQTT_DYNALITE_PREFIX}/set/res/"):
-        handle_response_ack(topic, payload,pending_responses,mqtt_client)
-    elif topic == MQTT_DYNALITE_WILL:
-        bridge_online["dynalite"] = payload.lower() == "online"
+def request_reload():
+    # Called from the web UI thread; run the reload where MQTT messages are handled
+    if mqtt_client is None:
+        reload_dynalite_config()
+    else:
+        mqtt_client.run_in_loop(reload_dynalite_config)
+
+
+def on_ha_command(topic, payload, area, channel):
+    handle_ha_brightness_command(area, channel, payload, dynalite_map, mqtt_client, pending_responses)
+
+
+def on_state_seed(topic, payload, area, channel):
+    seed_from_retained(topic, payload)
+
+
+def on_dynet_packet(topic, payload):
+    try:
+        parsed = payload if isinstance(payload, dict) else json.loads(payload)
+        handle_dynet_packet(parsed, dynalite_map,mqtt_client)
+    except Exception as e:
+        log("❌ Invalid Dynalite JSON: %s", e, level=ERROR)
+
+
+def on_dynet_raw(topic, payload):
+    handle_raw_frame(payload, dynalite_map, mqtt_client)
+
+
+# Dispatch keys: everything about one area (HA commands, gateway packets and
+# raw frames) goes to the same worker, so commands, replies and panel reports
+# for a light are handled in arrival order.
+
+def area_key(payload, area, channel):
+    return area, payload
+
+
+def packet_area_key(payload):
+    try:
+        parsed = json.loads(payload)
+        return get_val_by_mestype("MES_AREA", parsed.get("fields"), parsed.get("field_types"), True), parsed
+    except Exception:
+        return None, payload   # the handler logs it
+
+
+def raw_area_key(payload):
+    try:
+        frame = decode_raw_payload(payload)
+        return frame.area, frame
+    except ValueError:
+        return None, payload   # the handler logs it
+
+
+def on_response_ack(topic, payload, response_id):
+    handle_response_ack(response_id, payload, pending_responses, mqtt_client)
+
+
+def gateway_status_handler(gateway):
+    def on_gateway_status(topic, payload):
+        gateway.online = payload.lower() == "online"
+        log(f"🔌 Gateway {gateway.name} is {payload}")
+    return on_gateway_status
+
+
+def build_router():
+    router = TopicRouter(dispatcher=dispatcher)
+    light = [*MQTT_HOMEASSISTANT_PREFIX.split("/"), "light", prefixed_int("dynet_area_"), prefixed_channel("channel_")]
+    # light topics are a bounded set, so their parse is cached; ack topics carry a fresh id each time
+    router.add(light + ["brightness", "set"], on_ha_command, "ha_command", cache=True, prepare=area_key)
+    # only retained states seed the cache; live ones are the bridge's own publishes echoed back
+    router.add(light + ["brightness"], on_state_seed, "state_seed", cache=True, retained_only=True)
+    # packets from every gateway feed the same handlers; response ids are unique across gateways
+    for gateway in gateways:
+        dynet = gateway.prefix.split("/")
+        router.add(dynet, on_dynet_packet, "dynet_packet", prepare=packet_area_key)
+        router.add(gateway.raw_topic.split("/"), on_dynet_raw, "dynet_raw", prepare=raw_area_key)
+        router.add(dynet + ["set", "res", any_level], on_response_ack, "response_ack")
+        router.add(gateway.will_topic.split("/"), gateway_status_handler(gateway), "gateway_status")
+    return router
+
+
+router = build_router()
+
+
+def mqtt_callback(topic, payload, retain=False):
+    router.dispatch(topic, payload, retain)
+
+
+def register_metrics():
+    """Expose the counters the components already keep, read when /metrics is scraped."""
+    registry.callback("dynalite_pending_responses", "Gateway acks outstanding", lambda: len(pending_responses))
+    registry.callback("dynalite_responses_expired_total", "Gateway acks that never arrived",
+                      lambda: pending_responses.expired, kind="counter")
+    registry.register(CallbackHistogram(
+        "dynalite_ack_rtt_seconds", "Gateway ack round trip",
+        lambda: (LATENCY_BUCKETS, {"": pending_responses.latency_counts + [pending_responses.latency_sum]})))
+    registry.callback("dynalite_dispatch_queue_depth", "Messages waiting per dispatch worker",
+                      lambda: dispatcher.depths() if dispatcher is not None else {}, label="worker")
+    registry.callback("dynalite_dispatch_busy_seconds_total", "Handler time per dispatch worker",
+                      lambda: dispatcher.stats()["busy_seconds"] if dispatcher is not None else {},
+                      kind="counter", label="worker")
+    registry.callback("dynalite_routed_topics_cached", "Topics with a cached route parse",
+                      lambda: router.stats()["cached_topics"])
+    registry.callback("dynalite_gateway_online", "Gateway availability",
+                      lambda: {name: int(online) for name, online in gateways.online().items()}, label="gateway")
+
+    def publish_queue_stats():
+        queue = getattr(mqtt_client, "publish_queue", None)
+        return queue.stats() if queue is not None else {}
+    registry.callback("dynalite_publish_queue_depth", "Coalescing queue depth",
+                      lambda: publish_queue_stats().get("depth", 0))
+    registry.callback("dynalite_publish_coalesced_total", "State updates collapsed in the publish queue",
+                      lambda: publish_queue_stats().get("coalesced", 0), kind="counter")
+    registry.callback("dynalite_publish_flush_latency_seconds", "First enqueue to publish of the last queue flush",
+                      lambda: publish_queue_stats().get("last_flush_latency", 0.0))
+    registry.callback("dynalite_publish_flush_max_latency_seconds", "Longest queue flush latency",
+                      lambda: publish_queue_stats().get("max_flush_latency", 0.0))
+    registry.callback("dynalite_state_cache_total", "State publishes by cache decision",
+                      lambda: {k: v for k, v in state_cache.stats().items() if k != "entries"},
+                      kind="counter", label="result")
+    registry.callback("dynalite_commands_debounced_total", "HA commands by debouncer outcome",
+                      lambda: {k: v for k, v in command_debouncer.stats().items() if k != "active"},
+                      kind="counter", label="outcome")
+    registry.callback("dynalite_scene_batches_total", "Per-area HA command batches by outcome",
+                      lambda: {"collapsed": scene_planner.collapsed,
+                               "separate": scene_planner.batches - scene_planner.collapsed},
+                      kind="counter", label="outcome")
+
+    def scheduler_field(field):
+        return {(gateway.name, name): s[field]
+                for gateway in gateways if gateway.scheduler is not None
+                for name, s in gateway.scheduler.stats().items()}
+    bus_labels = ("gateway", "priority")
+    registry.callback("dynalite_bus_queue_depth", "Frames waiting for bus capacity",
+                      lambda: scheduler_field("depth"), label=bus_labels)
+    registry.callback("dynalite_bus_frames_sent_total", "Frames released to the gateway",
+                      lambda: scheduler_field("sent"), kind="counter", label=bus_labels)
+    registry.callback("dynalite_bus_frames_dropped_total", "Frames dropped on a full bus queue",
+                      lambda: scheduler_field("dropped"), kind="counter", label=bus_labels)
+    registry.callback("dynalite_bus_max_wait_seconds", "Longest queueing delay per priority",
+                      lambda: scheduler_field("max_wait"), label=bus_labels)
+    registry.callback("dynalite_bus_avg_wait_seconds", "Average queueing delay per priority",
+                      lambda: scheduler_field("avg_wait"), label=bus_labels)
+
+    registry.callback("dynalite_discovery_entities_total", "Discovery payloads built or reused",
+                      lambda: dict(discovery.stats), kind="counter", label="source")
+    registry.callback("dynalite_recovery_messages_total", "Messages replayed after reconnects",
+                      lambda: recovery.stats["messages"], kind="counter")
+    registry.callback("dynalite_sync_requests_total", "Current-preset requests sent by sync sweeps",
+                      lambda: sync_sweep.stats["requests"], kind="counter")
+    registry.callback("dynalite_sync_last_duration_seconds", "Duration of the last sync sweep",
+                      lambda: sync_sweep.stats["last_duration"])
+
 
 async def main():
     global mqtt_client
     global dynalite_map
     global pending_responses
+    global router
+    global dispatcher
     log("🚀 Starting HA Climate → Dynalite Bridge")
 
-    init_web_ui(CONFIG_PATH, reload_dynalite_config)
+    register_metrics()
+    init_web_ui(CONFIG_PATH, request_reload)
     run_web_ui()
     log(f"🌐 Web UI available at http://localhost:{CONFIG_PORT}")
     
     dynalite_map = load_dynalite_config(CONFIG_PATH)
-    mqtt_client = start_mqtt(dynalite_map, on_message=mqtt_callback)
+    if DISPATCH_WORKERS > 0:
+        dispatcher = KeyedDispatcher(workers=DISPATCH_WORKERS, max_queue=DISPATCH_QUEUE_MAX,
+                                     block_timeout=DISPATCH_BLOCK_MS / 1000)
+        log(f"🧵 Dispatching inbound messages to {DISPATCH_WORKERS} workers")
+    mqtt_client = start_mqtt(dynalite_map, on_message=mqtt_callback, loop=asyncio.get_running_loop())
+    router = build_router()
 
     publish_light_discovery(mqtt_client, dynalite_map)
+    if state_store is not None:
+        # last-known levels go out now, the sync sweep corrects them later
+        restore_states(mqtt_client, dynalite_map)
+        asyncio.create_task(flush_state_store())
     asyncio.create_task(sweep_pending_responses(pending_responses))
+    if SYNC_ON_START or SYNC_INTERVAL > 0:
+        asyncio.create_task(sync_sweep_loop(lambda: dynalite_map, pending_responses,
+                                            start_delay=SYNC_START_DELAY, interval=SYNC_INTERVAL))
+    if tracer.enabled:
+        log(f"⏱️ Tracing 1 in {tracer.every} HA commands")
+        if TRACE_DUMP_PATH:
+            asyncio.create_task(trace_dump_loop(TRACE_DUMP_PATH))
 
     try:
         while True:
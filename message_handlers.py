@@ -1,46 +1,92 @@
 # message_handlers.py
 import json
-import re
-from utils import get_val_by_mestype, log
+from utils import get_val_by_mestype, log, DEBUG, WARNING, ERROR
 from mqtt_handlers import pub2dynet
-from datetime import datetime, timezone
+from bus_scheduler import PRIORITY_USER, PRIORITY_CONFIRM
+from state_cache import publish_if_changed, state_cache
+from command_debouncer import command_debouncer
+from scene_planner import scene_planner, SCENE_FRAMES_SAVED
+from state_store import state_store
+from tracing import tracer
 from collections import defaultdict
 
-from helpers.dynet_mqtt import (
-    build_area_preset_body,
-    build_request_current_preset,
-    build_request_set_preset_dyn1
-)
+from config_loader import get_dynalite_index
+from helpers.dynet_frame import DynetFrame
 from config import (
-    MQTT_HOMEASSISTANT_PREFIX,
-    PRESET_NONE_OFF
+    PRESET_NONE_OFF,
+    SCENE_FRAME
 )
 
 
-def handle_ha_brightness_command(topic: str, payload: str, dynalite_map: dict,mqtt_client,pending_responses):
-    match = re.search(r"dynet_area_(\d+)/channel_(\d+|all)/", topic)
-    if not match:
-        log(f"❌ Invalid HA brightness topic: {topic}")
-        return
-
-    area = int(match.group(1))
-    str_channel = match.group(2)
+def publish_preset_state(area: int, channel: str, preset, dynalite_map: dict, mqtt_client, confirmed=True,
+                         reply=False):
+    """
+    Publish the HA brightness for an (area, channel) now at `preset`; for the
+    "all" master also fan the level out to every mapped child channel.
+    `confirmed` is False for the optimistic update made when HA sends a command.
+    `reply` marks a current-preset reply: it only reports the last preset recalled,
+    so it does not overwrite the exact level of `mode: level` channels.
+    """
+    index = get_dynalite_index(dynalite_map)
+    entry = index.channels.get((area, channel))
+    if entry is None:
+        if area not in index.children:
+            log("⚠️ Area %s not found in config — skipping", area, level=DEBUG)
+        else:
+            log("⛔ Channel %s not mapped in area %s", channel, area, level=DEBUG)
+        return False
+
+    level = entry.preset_level.get(preset)
+    if level is None:
+        log("⛔ Preset: %s not found in %s area: %s channel: %s", preset, list(entry.presets), area, channel, level=WARNING,
+            area=area, channel=channel)
+        return False
+    if reply and entry.mode == "level":
+        return True
+
+    trace = tracer.reply((area, entry.channel)) if confirmed else None
+    if state_store is not None:
+        state_store.record(area, entry.channel, level)
+    if publish_if_changed(mqtt_client=mqtt_client,topic=entry.state_topic,brightness=level):
+        log("✅ Preset %s = Brightness: %.0f%% published to %s", preset, level * 100 / 255, entry.state_topic)
+    if trace is not None:
+        tracer.finish(trace)
+
+    if entry.channel == "all":
+        # Master level already determined above
+        master = min(max(level, 0), 255)
+        for child in index.children.get(area, ()):
+            if reply and child.mode == "level":
+                continue
+            closest_level = child.nearest_level[master]
+            if state_store is not None:
+                state_store.record(area, child.channel, closest_level)
+            if publish_if_changed(mqtt_client=mqtt_client,topic=child.state_topic,brightness=closest_level):
+                log("✅ Master preset %s → Channel %s brightness %.0f%% published to %s",
+                    preset, child.channel, closest_level * 100 / 255, child.state_topic, level=DEBUG)
+    return True
+
+
+def handle_ha_brightness_command(area: int, str_channel: str, payload: str, dynalite_map: dict,mqtt_client,pending_responses):
+    """`area` and `str_channel` come parsed from the command topic by the topic router."""
     brightness = int(payload)
 
-    log(f"HA Brightness Set → Area: {area}, Channel: {str_channel}, Brightness: {brightness}")
+    log("HA Brightness Set → Area: %s, Channel: %s, Brightness: %s", area, str_channel, brightness)
+    trace = tracer.begin((area, str_channel))
 
-    presets, levels = [
-        dynalite_map.get("areas", {}).get(area, {}).get("channels", {}).get(str_channel, {}).get(k,
-            dynalite_map.get("defaults", {}).get(k, [])) for k in ("presets", "levels")
-    ]
+    index = get_dynalite_index(dynalite_map)
+    entry = index.channels.get((area, str_channel), index.defaults)
 
-    if not levels or not presets:
-        log(f"⚠️ No presets/levels for area {area}, channel {str_channel}")
+    if entry.mode == "level" and entry.mapped:
+        send_channel_level(entry, brightness, mqtt_client, pending_responses, trace)
         return
 
-    closest_level = min(levels, key=lambda lv: abs(lv - brightness))
-    idx = levels.index(closest_level)
-    preset = presets[idx] if idx < len(presets) else None
+    if not entry.levels or not entry.presets:
+        log("⚠️ No presets/levels for area %s, channel %s", area, str_channel, level=WARNING,
+            area=area, channel=str_channel)
+        return
+
+    preset = entry.nearest_preset[min(max(brightness, 0), 255)]
 
     if str_channel == "all":
         zero_based_channel = 0x0000
@@ -60,81 +106,123 @@ def handle_ha_brightness_command(topic: str, payload: str, dynalite_map: dict,mq
     '''    
         
     # force dyn1 packet
-    try:
-        hex_msg = build_request_set_preset_dyn1(area=area, preset=preset, channel=channel)
-        log(f"📤 Sending Dynalite1 Packet → {hex_msg}")
-        pub2dynet(type="dynet1", hex_string=hex_msg, pending_responses=pending_responses)
-    except Exception as e:
-        log(f"⚠️ Error Sending Dynalite1 Packet {e}")
+    def send():
+        try:
+            hex_msg = DynetFrame.set_preset_dyn1(area=area, preset=preset, channel=channel).hex_string
+            tracer.mark(trace, "frame_built")
+            log("📤 Sending Dynalite1 Packet → %s", hex_msg, level=DEBUG)
+            pub2dynet(type="dynet1", hex_string=hex_msg, pending_responses=pending_responses,
+                      priority=PRIORITY_USER, area=area, trace=trace)
+        except Exception as e:
+            log("⚠️ Error Sending Dynalite1 Packet %s", e, level=ERROR, area=area, channel=str_channel)
+
+    def confirm():
+        try:
+            # Request confirmation
+            confirm_msg = DynetFrame.request_current_preset(area=area, channel=channel).hex_string
+            tracer.mark(trace, "confirm_requested")
+            pub2dynet(type="dynet1", hex_string=confirm_msg, pending_responses=pending_responses,
+                      priority=PRIORITY_CONFIRM, area=area, trace=trace)
+            log("✅ Confirmation requested for area %s channel %s", area, channel, level=DEBUG)
+        except Exception as e:
+            log("⚠️ Error Sending Dynalite1 Packet %s", e, level=ERROR, area=area, channel=str_channel)
+
+    def submit():
+        # slider drags: superseded commands are dropped, one confirmation per burst
+        command_debouncer.submit((area, str_channel), send, confirm, mqtt_client.call_later, value=preset)
 
-    try:
-        # Request confirmation
-        confirm = build_request_current_preset(area=area, channel=channel)
-        pub2dynet(type="dynet1", hex_string=confirm, pending_responses=pending_responses)
-        log(f"✅ Confirmation requested for area {area} channel {channel}")
-    except Exception as e:
-        log(f"⚠️ Error Sending Dynalite1 Packet {e}")
+    if str_channel == "all":
+        # channel commands already gathered for this area go out first, as they arrived
+        scene_planner.flush(area)
+        submit()
+    else:
+        scene_planner.submit(area, str_channel, preset, submit, mqtt_client.call_later,
+                             lambda area, presets: send_area_preset(area, presets, dynalite_map,
+                                                                    mqtt_client, pending_responses))
 
     # Update MQTT state (ahead of confirmation)
+    publish_preset_state(area, str_channel, preset, dynalite_map, mqtt_client, confirmed=False)
+
+
+def send_channel_level(entry, brightness: int, mqtt_client, pending_responses, trace=None):
+    """
+    `mode: level` channels: send the HA brightness as a Dynet2 0x10 channel level
+    frame with the channel's fade, and publish it as the state right away.
+    The level is exact, so no confirmation request follows.
+    """
+    area = entry.area
+    brightness = min(max(brightness, 0), 255)
+    level = round(brightness * 254 / 255)   # 0x10 levels run 0-254
+
+    def send():
+        try:
+            frame = DynetFrame.channel_level_dyn2(area=area, channel=int(entry.channel), level=level,
+                                                  join=0xFF, fade=entry.fade)
+            tracer.mark(trace, "frame_built")
+            log("📤 Sending Dynalite2 level Packet → %s", frame.hex_string, level=DEBUG)
+            pub2dynet(type="dynet2", hex_string=frame.hex_string, pending_responses=pending_responses,
+                      priority=PRIORITY_USER, area=area, trace=trace)
+        except Exception as e:
+            log("⚠️ Error Sending Dynalite2 Packet %s", e, level=ERROR, area=area, channel=entry.channel)
+
+    command_debouncer.submit((area, entry.channel), send, None, mqtt_client.call_later, value=level)
+
+    if state_store is not None:
+        state_store.record(area, entry.channel, brightness)
+    if publish_if_changed(mqtt_client=mqtt_client, topic=entry.state_topic, brightness=brightness):
+        log("✅ Level %.0f%% published to %s", brightness * 100 / 255, entry.state_topic)
+    if trace is not None:
+        tracer.finish(trace)   # the commanded level is the state, nothing else to wait for
+
+
+def send_area_preset(area: int, presets: dict, dynalite_map: dict, mqtt_client, pending_responses) -> bool:
+    """
+    Send a batch of channel commands ({channel: preset}) as one area preset frame
+    when together they recall that preset: every commanded channel resolved to
+    the same preset, and every other mapped channel of the area is already at
+    its level for it. Returns False (nothing sent) otherwise.
+    """
+    index = get_dynalite_index(dynalite_map)
+    children = index.children.get(area, ())
+    wanted = set(presets.values())
+    if len(wanted) != 1 or not children:
+        return False
+    preset = wanted.pop()
+    commanded = 0
+    for child in children:
+        if child.channel in presets:
+            commanded += 1
+        elif state_cache.get(child.state_topic) != child.preset_level.get(preset, -1):
+            return False
+    if commanded != len(presets):
+        return False  # a commanded channel is not mapped in the area
+
+    def send():
+        try:
+            if SCENE_FRAME == "dynet2":
+                frame = DynetFrame.area_preset_dyn2(area=area, preset=preset)
+            else:
+                frame = DynetFrame.set_preset_dyn1(area=area, preset=preset, channel=0xFF)
+            log("📤 Sending area preset %s for %s channels → %s", preset, len(presets), frame.hex_string, level=DEBUG)
+            pub2dynet(type=frame.type, hex_string=frame.hex_string, pending_responses=pending_responses,
+                      priority=PRIORITY_USER, area=area)
+        except Exception as e:
+            log("⚠️ Error Sending area preset %s", e, level=ERROR, area=area, channel="all")
+
+    def confirm():
+        try:
+            confirm_msg = DynetFrame.request_current_preset(area=area, channel=0xFF).hex_string
+            pub2dynet(type="dynet1", hex_string=confirm_msg, pending_responses=pending_responses,
+                      priority=PRIORITY_CONFIRM, area=area)
+        except Exception as e:
+            log("⚠️ Error Sending Dynalite1 Packet %s", e, level=ERROR, area=area, channel="all")
+
+    command_debouncer.submit((area, "all"), send, confirm, mqtt_client.call_later, value=preset)
+    # one command frame and one confirmation instead of one of each per channel
+    SCENE_FRAMES_SAVED.inc(amount=2 * (len(presets) - 1))
+    log("🎬 Area %s: %s channel commands sent as preset %s", area, len(presets), preset)
+    return True
 
-    if channel is None:
-        log(f"⚠️ Channel is None, so setting Channel to 'all'")
-        channel = "all"
-
-    if channel == 0xFF or channel == 0xFFFF:
-        channel = "all"
-    elif isinstance(channel, int) and type == "dynet1":
-        channel += 1
-
-    area_cfg = dynalite_map.get("areas", {}).get(area)
-    if not area_cfg:
-        log(f"⚠️ Area {area} not found in config — skipping")
-        return
-
-    if not str(channel) in area_cfg.get("channels", {}):
-        log(f"⛔ Channel {channel} not mapped in area {area}")
-        return
-
-    presets, levels = [
-        dynalite_map["areas"][area]["channels"].get(str(channel), {}).get(k, dynalite_map.get("defaults", {}).get(k, []))
-        for k in ("presets", "levels")
-    ]
-
-    #send the MQTT command here to update the levels
-    if preset in presets:
-        idx = presets.index(preset)
-        level = levels[idx] if idx < len(levels) else 0
-        topic_out = f"{MQTT_HOMEASSISTANT_PREFIX}/light/dynet_area_{area}/channel_{channel}/brightness"
-        mqtt_client.publish(topic_out, level)
-        #publish_if_changed(mqtt_client=mqtt_client,topic=topic_out,brightness=level)
-        log(f"✅ Preset {preset} = Brightness: {round((level/255)*100,0)}% published to {topic_out}")
-
-        if str(channel) == "all":
-            # Master level already determined above
-            for ch_str, ch_cfg in area_cfg.get("channels", {}).items():
-                if ch_str == "all":
-                    continue  # Skip master itself
-                ch_presets = ch_cfg.get("presets", dynalite_map.get("defaults", {}).get("presets", []))
-                ch_levels = ch_cfg.get("levels", dynalite_map.get("defaults", {}).get("levels", []))
-                if ch_levels:
-                    # Find the closest matching level in this channel
-                    closest_level = min(ch_levels, key=lambda lv: abs(lv - level))
-                    level_idx = ch_levels.index(closest_level)
-                else:
-                    closest_level = 0
-                    level_idx = 0
-                # Optional: also map back to a preset if needed
-                ch_preset = ch_presets[level_idx] if level_idx < len(ch_presets) else None
-                topic_out = f"{MQTT_HOMEASSISTANT_PREFIX}/light/dynet_area_{area}/channel_{ch_str}/brightness"
-                #do not use cache
-                #publish_if_changed(mqtt_client=mqtt_client,topic=topic_out,brightness=level)                        
-                mqtt_client.publish(topic_out, closest_level)
-                log(f"✅ Master preset {preset} → Channel {ch_str} brightness {round((closest_level/255)*100,0)}% published to {topic_out}")
-                
-        return
-
-    else:
-        log(f"⛔ Preset: {preset} [level: {closest_level}] not found in {presets} area: {area} channel: {channel}")    
 
 def handle_dynet_packet(parsed, dynalite_map,mqtt_client):
     try:
@@ -154,11 +242,11 @@ def handle_dynet_packet(parsed, dynalite_map,mqtt_client):
             channel = get_val_by_mestype("MES_CHANNEL_ZERO_BASED" if type == "dynet1" else "MES_CHANNEL_DYNET2_LOGICAL", fields, field_types, True)
 
             if area is None or preset is None:
-                log(f"⛔ Incomplete Dynet message: {parsed}")
+                log("⛔ Incomplete Dynet message: %s", parsed, level=WARNING, area=area)
                 return
 
             if channel is None:
-                log(f"⚠️ Channel is None, so setting Channel to 'all'. Description: '{description}'")
+                log("⚠️ Channel is None, so setting Channel to 'all'. Description: '%s'", description, level=DEBUG)
                 channel = "all"
 
             if channel == 0xFF or channel == 0xFFFF:
@@ -166,75 +254,30 @@ def handle_dynet_packet(parsed, dynalite_map,mqtt_client):
             elif isinstance(channel, int) and type == "dynet1":
                 channel += 1
 
-            area_cfg = dynalite_map.get("areas", {}).get(area)
-            if not area_cfg:
-                log(f"⚠️ Area {area} not found in config — skipping")
-                return
-
-            if not str(channel) in area_cfg.get("channels", {}):
-                log(f"⛔ Channel {channel} not mapped in area {area}")
-                return
-
-            presets, levels = [
-                dynalite_map["areas"][area]["channels"].get(str(channel), {}).get(k, dynalite_map.get("defaults", {}).get(k, []))
-                for k in ("presets", "levels")
-            ]
-
-            if preset in presets:
-                idx = presets.index(preset)
-                level = levels[idx] if idx < len(levels) else 0
-                topic_out = f"{MQTT_HOMEASSISTANT_PREFIX}/light/dynet_area_{area}/channel_{channel}/brightness"
-                mqtt_client.publish(topic_out, level)
-                #publish_if_changed(mqtt_client=mqtt_client,topic=topic_out,brightness=level)
-                log(f"✅ Preset {preset} = Brightness: {round((level/255)*100,0)}% published to {topic_out}")
-
-                if str(channel) == "all":
-                    # Master level already determined above
-                    for ch_str, ch_cfg in area_cfg.get("channels", {}).items():
-                        if ch_str == "all":
-                            continue  # Skip master itself
-                        ch_presets = ch_cfg.get("presets", dynalite_map.get("defaults", {}).get("presets", []))
-                        ch_levels = ch_cfg.get("levels", dynalite_map.get("defaults", {}).get("levels", []))
-                        if ch_levels:
-                            # Find the closest matching level in this channel
-                            closest_level = min(ch_levels, key=lambda lv: abs(lv - level))
-                            level_idx = ch_levels.index(closest_level)
-                        else:
-                            closest_level = 0
-                            level_idx = 0
-                        # Optional: also map back to a preset if needed
-                        ch_preset = ch_presets[level_idx] if level_idx < len(ch_presets) else None
-                        topic_out = f"{MQTT_HOMEASSISTANT_PREFIX}/light/dynet_area_{area}/channel_{ch_str}/brightness"
-                        #do not use cache
-                        #publish_if_changed(mqtt_client=mqtt_client,topic=topic_out,brightness=level)                        
-                        mqtt_client.publish(topic_out, closest_level)
-                        log(f"✅ Master preset {preset} → Channel {ch_str} brightness {round((closest_level/255)*100,0)}% published to {topic_out}")
-                        
-                return
-
-            else:
-                log(f"⛔ Preset: {preset} not found in {presets}")
+            publish_preset_state(area, str(channel), preset, dynalite_map, mqtt_client,
+                                 reply=description.startswith("reply"))
 
     except Exception as e:
-        log(f"❌ Failed to handle Dynet packet: {e}")
+        log("❌ Failed to handle Dynet packet: %s", e, level=ERROR)
 
 
-def handle_response_ack(topic, payload, pending_responses, mqtt_client):
+def handle_response_ack(response_id, payload, pending_responses, mqtt_client):
     try:
-        response_id = topic.split("/")[-1]
+        tracer.ack(response_id)
         result = json.loads(payload)
-        entry = pending_responses.pop(response_id, None)
+        entry = pending_responses.pop(response_id)
         if entry:
-            elapsed = (datetime.now(timezone.utc) - entry["sent_at"]).total_seconds()
-            comment = entry.get("comment", "-")
+            elapsed = entry.elapsed
+            comment = entry.comment or "-"
             status = result.get("status", "Unknown")
             if status.lower() != "ok":
-                log(f"❌❌❌ Response ID {response_id} failed — Status: {status}, Time: {elapsed:.2f}s, Comment: {comment}")
+                log("❌❌❌ Response ID %s failed — Status: %s, Time: %.2fs, Comment: %s", response_id, status, elapsed, comment,
+                    level=ERROR, response_id=response_id)
             else:
                 #log(f"✅ Confirmed sent Dynet")
                 return
     except Exception as e:
-        log(f"❌ Error handling response ack: {e}")
+        log("❌ Error handling response ack: %s", e, level=ERROR, response_id=response_id)
 
 
 def is_preset_related(description: str) -> bool:
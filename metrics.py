@@ -0,0 +1,187 @@
+# metrics.py
+# Prometheus-style metrics. Recording touches only a per-thread shard (no locks,
+# no shared writes); shards are summed when /metrics is scraped.
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _labels(label_name, label_value, extra=None):
+    pairs = []
+    if isinstance(label_name, tuple):   # several labels, value is a tuple in the same order
+        pairs.extend(f'{name}="{value}"' for name, value in zip(label_name, label_value))
+    elif label_name:
+        pairs.append(f'{label_name}="{label_value}"')
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Sharded:
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []   # (thread, shard)
+        self._retired = {}  # merged shards of finished threads
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                # short-lived threads (e.g. threading.Timer) would otherwise pile up until a scrape
+                self._retire_dead()
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _retire_dead(self):
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = live
+
+    def _collect(self):
+        with self._lock:
+            self._retire_dead()
+            live = self._shards
+            merged = {}
+            self._merge(merged, self._retired)
+            for _, shard in live:
+                self._merge(merged, dict(shard))
+        return merged
+
+
+class Counter(_Sharded):
+    kind = "counter"
+
+    def inc(self, label="", amount=1):
+        shard = self._shard()
+        shard[label] = shard.get(label, 0) + amount
+
+    @staticmethod
+    def _merge(into, shard):
+        for key, value in shard.items():
+            into[key] = into.get(key, 0) + value
+
+    def render(self):
+        values = self._collect() or ({"": 0} if not self.label else {})
+        return [f"{self.name}{_labels(self.label, key)} {value}" for key, value in sorted(values.items())]
+
+
+class Histogram(_Sharded):
+    kind = "histogram"
+
+    def __init__(self, name, help, label=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, label)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, label=""):
+        shard = self._shard()
+        cells = shard.get(label)
+        if cells is None:
+            cells = shard[label] = [0] * (len(self.buckets) + 2)  # buckets, +Inf, sum
+        cells[bisect.bisect_left(self.buckets, value)] += 1
+        cells[-1] += value
+
+    @staticmethod
+    def _merge(into, shard):
+        for key, cells in shard.items():
+            target = into.get(key)
+            if target is None:
+                into[key] = list(cells)
+            else:
+                for idx, value in enumerate(cells):
+                    target[idx] += value
+
+    def render(self):
+        return render_histogram(self.name, self.buckets, self._collect(), self.label)
+
+
+def render_histogram(name, buckets, cells_by_label, label=None):
+    """cells: per-bucket counts (non-cumulative) for each bound, then +Inf, then sum."""
+    lines = []
+    for key, cells in sorted(cells_by_label.items()):
+        running = 0
+        for bound, count in zip(buckets + (float("inf"),), cells):
+            running += count
+            le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+            lines.append(f"{name}_bucket{_labels(label, key, le)} {running}")
+        lines.append(f"{name}_sum{_labels(label, key)} {cells[-1]}")
+        lines.append(f"{name}_count{_labels(label, key)} {running}")
+    return lines
+
+
+class Callback:
+    """Value read at scrape time from existing state: fn() -> number or {label value: number}."""
+
+    def __init__(self, name, help, fn, kind="gauge", label=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        self.label = label
+
+    def render(self):
+        value = self.fn()
+        if isinstance(value, dict):
+            return [f"{self.name}{_labels(self.label, key)} {val}" for key, val in value.items()]
+        return [f"{self.name} {value}"]
+
+
+class CallbackHistogram(Callback):
+    """fn() -> (buckets, {label value: cells}) from a component that keeps its own histogram."""
+
+    def __init__(self, name, help, fn, label=None):
+        super().__init__(name, help, fn, kind="histogram", label=label)
+
+    def render(self):
+        buckets, cells_by_label = self.fn()
+        return render_histogram(self.name, tuple(buckets), cells_by_label, self.label)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, label=None) -> Counter:
+        return self.register(Counter(name, help, label))
+
+    def histogram(self, name, help, label=None, buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, label, buckets))
+
+    def callback(self, name, help, fn, kind="gauge", label=None) -> Callback:
+        return self.register(Callback(name, help, fn, kind, label))
+
+    def render(self) -> str:
+        out = []
+        for metric in list(self._metrics.values()):
+            try:
+                lines = metric.render()
+            except Exception:
+                continue
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+
+MESSAGES_RECEIVED = registry.counter(
+    "dynalite_messages_received_total", "MQTT messages received by topic class", label="topic_class")
+HANDLER_SECONDS = registry.histogram(
+    "dynalite_handler_seconds", "Time spent in message handlers", label="handler")
+PUBLISHES = registry.counter(
+    "dynalite_mqtt_publishes_total", "MQTT publishes by result", label="result")
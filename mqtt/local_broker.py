@@ -0,0 +1,143 @@
+import asyncio
+import json
+import threading
+from typing import Optional
+from paho.mqtt.client import topic_matches_sub
+from mqtt.publish_queue import PublishQueue
+
+
+class LocalBroker:
+    """
+    In-process MQTT broker stand-in: retained messages, wildcard subscriptions
+    and LWT, delivered on an asyncio loop (or inline when no loop is given).
+    Meant for tests and benchmarks, not for production traffic.
+    """
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.retained = {}
+        self.subscriptions = []  # (pattern, client)
+        self.published = 0
+
+    def connect(self, client):
+        client.connected = True
+        self._deliver(client._handle_connect)
+
+    def disconnect(self, client, unexpected=False):
+        client.connected = False
+        self.subscriptions = [(p, c) for p, c in self.subscriptions if c is not client]
+        if unexpected and client.will_topic:
+            self.publish(client.will_topic, client.will_payload, retain=client.will_retain)
+
+    def subscribe(self, client, pattern):
+        self.subscriptions.append((pattern, client))
+        for topic, payload in list(self.retained.items()):
+            if topic_matches_sub(pattern, topic):
+                self._deliver(client._handle_message, topic, payload, True)
+
+    def unsubscribe(self, client, pattern):
+        self.subscriptions = [(p, c) for p, c in self.subscriptions if not (p == pattern and c is client)]
+
+    def publish(self, topic, payload, retain=False):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        elif not isinstance(payload, (bytes, bytearray)):
+            payload = str(payload).encode()
+        self.published += 1
+        if retain:
+            if payload:
+                self.retained[topic] = bytes(payload)
+            else:
+                self.retained.pop(topic, None)
+        delivered = set()
+        for pattern, client in self.subscriptions:
+            if id(client) not in delivered and topic_matches_sub(pattern, topic):
+                delivered.add(id(client))
+                self._deliver(client._handle_message, topic, bytes(payload), False)
+
+    def _deliver(self, func, *args):
+        if self.loop is None:
+            func(*args)
+        else:
+            self.loop.call_soon_threadsafe(func, *args)
+
+
+class LocalMQTTClient:
+    """
+    Drop-in for MQTTPublisher (publish/subscribe/LWT/callbacks) wired to a LocalBroker.
+    Callbacks get this object as `client`, so on_connect handlers can subscribe on it.
+    """
+
+    def __init__(self, broker: LocalBroker, will_topic=None, will_payload="offline",
+                 will_retain=True, on_connect=None, on_disconnect=None, on_message=None,
+                 coalesce_window=0.0, batch_size=50, raw_topics=()):
+        self.broker = broker
+        self.loop = broker.loop
+        self.transport = "asyncio" if broker.loop else "thread"
+        self.will_topic = will_topic
+        self.will_payload = will_payload
+        self.will_retain = will_retain
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.on_message = on_message
+        self.connected = False
+        self.raw_topics = frozenset(raw_topics)
+        self.publish_queue = (
+            PublishQueue(self._publish_batch, self.call_later, window=coalesce_window, batch_size=batch_size)
+            if coalesce_window > 0 else None
+        )
+
+    def connect(self):
+        self.broker.connect(self)
+
+    def _handle_connect(self):
+        if self.will_topic:
+            self.publish(self.will_topic, "online", retain=self.will_retain)
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0)
+
+    def _handle_message(self, topic, payload: bytes, retain=False):
+        if self.on_message:
+            self.on_message(topic, payload if topic in self.raw_topics else payload.decode(), retain)
+
+    def run_in_loop(self, func, *args):
+        if self.loop is None:
+            return func(*args)
+        self.loop.call_soon_threadsafe(func, *args)
+
+    def call_later(self, delay: float, func, *args):
+        if self.loop is None:
+            timer = threading.Timer(delay, func, args)
+            timer.daemon = True
+            timer.start()
+        else:
+            self.loop.call_soon_threadsafe(self.loop.call_later, delay, func, *args)
+
+    def enqueue(self, topic: str, payload, qos=0, retain=False):
+        if self.publish_queue is None:
+            return self.publish(topic, payload, qos=qos, retain=retain)
+        self.publish_queue.enqueue(topic, payload, qos, retain)
+        return True
+
+    def _publish_batch(self, batch) -> int:
+        return sum(not self.publish(topic, payload, qos=qos, retain=retain)
+                   for topic, payload, qos, retain in batch)
+
+    def publish(self, topic: str, payload, qos=0, retain=False) -> bool:
+        if not self.connected:
+            return False
+        if not isinstance(payload, (str, bytes, bytearray)):
+            payload = json.dumps(payload)
+        self.broker.publish(topic, payload, retain=retain)
+        return True
+
+    def subscribe(self, topic: str, qos=0):
+        self.broker.subscribe(self, topic)
+
+    def unsubscribe(self, topic: str):
+        self.broker.unsubscribe(self, topic)
+
+    def stop(self, unexpected=False):
+        self.broker.disconnect(self, unexpected=unexpected)
+        if self.on_disconnect:
+            self.on_disconnect(self, None, 0)
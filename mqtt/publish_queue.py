@@ -0,0 +1,112 @@
+import threading
+import time
+from typing import Callable
+
+
+class PublishQueue:
+    """
+    Coalescing outbound publish stage.
+
+    Updates to the same topic within `window` seconds collapse to the last one
+    (last-write-wins, first-enqueue order kept) and are flushed in batches of
+    `batch_size`, yielding to the network between batches.
+    """
+
+    def __init__(
+        self,
+        publish_batch: Callable[[list], int],
+        call_later: Callable[[float, Callable], None],
+        window: float = 0.02,
+        batch_size: int = 50
+    ):
+        """
+        :param publish_batch: Publishes a list of (topic, payload, qos, retain), returns failures
+        :param call_later: Scheduler, call_later(delay_seconds, func)
+        :param window: Coalescing window in seconds
+        :param batch_size: Max messages per flush
+        """
+        self.publish_batch = publish_batch
+        self.call_later = call_later
+        self.window = window
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._pending = {}  # topic -> (payload, qos, retain)
+        self._first_enqueued = None
+        self._flush_scheduled = False
+
+        # metrics
+        self.enqueued = 0
+        self.coalesced = 0
+        self.flushed = 0
+        self.failed = 0
+        self.flushes = 0
+        self.max_depth = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, topic: str, payload, qos=0, retain=False):
+        with self._lock:
+            self.enqueued += 1
+            if topic in self._pending:
+                self.coalesced += 1
+            elif not self._pending:
+                self._first_enqueued = time.monotonic()
+            self._pending[topic] = (payload, qos, retain)
+            depth = len(self._pending)
+            if depth > self.max_depth:
+                self.max_depth = depth
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self.call_later(self.window, self.flush)
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                self._flush_scheduled = False
+                return
+            started = self._first_enqueued
+            batch = []
+            for topic in self._pending:
+                batch.append(topic)
+                if len(batch) >= self.batch_size:
+                    break
+            batch = [(topic,) + self._pending.pop(topic) for topic in batch]
+            more = bool(self._pending)
+            self._flush_scheduled = more
+            if more:
+                self._first_enqueued = time.monotonic()
+
+        failed = self.publish_batch(batch)
+
+        latency = time.monotonic() - started
+        self.flushes += 1
+        self.flushed += len(batch) - failed
+        self.failed += failed
+        self.last_flush_latency = latency
+        self.total_flush_latency += latency
+        if latency > self.max_flush_latency:
+            self.max_flush_latency = latency
+
+        if more:
+            self.call_later(0, self.flush)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "last_flush_latency": self.last_flush_latency,
+            "max_flush_latency": self.max_flush_latency,
+            "avg_flush_latency": self.total_flush_latency / self.flushes if self.flushes else 0.0
+        }
@@ -1,15 +1,17 @@
 import paho.mqtt.client as mqtt
+import asyncio
 import json
-from datetime import datetime
+import threading
 from typing import Callable, Optional
+from mqtt.publish_queue import PublishQueue
+from metrics import PUBLISHES
+from utils import log
 class MQTTPublisher:
     
 
     
     def __init__(
         self,
-        #loop,
-  
         mqtt_username,
         mqtt_password,
         mqtt_port,
@@ -22,23 +24,44 @@ class MQTTPublisher:
         on_connect=None,
         on_disconnect=None,
         on_message=None,
-        logger: Optional[Callable[[str], None]] = None
+        logger: Optional[Callable[[str], None]] = None,
+        transport="thread",
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        reconnect_delay=5,
+        coalesce_window=0.0,
+        batch_size=50,
+        raw_topics=()
     ):
         """
         Initialize MQTT client with optional callbacks and LWT.
 
-        :param coolmaster_client: Reference to the CoolMaster client
-        :param loop: Asyncio event loop
+        :param transport: "thread" runs paho's loop_start() thread, "asyncio" drives
+                          the socket from `loop` so callbacks run on the event loop
+        :param loop: Asyncio event loop (asyncio transport only)
+        :param reconnect_delay: Seconds between reconnect attempts (asyncio transport only)
+        :param coalesce_window: Seconds enqueue() coalesces per-topic updates, 0 publishes directly
+        :param batch_size: Max messages per coalesced flush
+        :param raw_topics: Topics whose payload is passed to on_message as bytes instead of str
         :param will_topic: Last Will and Testament topic
         :param will_payload: Payload for LWT
         :param will_qos: QoS level for LWT
         :param will_retain: Whether the LWT message should be retained
         :param on_connect: Optional user-defined callback for connect event
         :param on_disconnect: Optional user-defined callback for disconnect event
-        :param on_message: Optional user-defined callback for incoming MQTT messages
+        :param on_message: Optional user-defined callback for incoming MQTT messages,
+                           called as on_message(topic, payload, retain)
         """
-        #self.loop = loop
+        self.transport = transport
+        self.loop = loop
+        self.reconnect_delay = reconnect_delay
+        self._misc_task = None
+        self._stopping = False
+        self.raw_topics = frozenset(raw_topics)
         self.client = mqtt.Client()
+        self.publish_queue = (
+            PublishQueue(self._publish_batch, self.call_later, window=coalesce_window, batch_size=batch_size)
+            if coalesce_window > 0 else None
+        )
 
         # Authentication
         self.client.username_pw_set(mqtt_username, mqtt_password)
@@ -57,9 +80,10 @@ class MQTTPublisher:
         self.will_retain = will_retain
 
         #logging
+        self.debug = bool(mqtt_debug)
         self.logger = (
             logger if mqtt_debug and logger
-            else (lambda msg: print(f"{datetime.now().strftime('%H:%M:%S')} 📡🧾 MQTT Client:{msg}")) if mqtt_debug
+            else (lambda msg: log("MQTT Client:%s", msg, tag="📡🧾")) if mqtt_debug
             else (lambda msg: None)
         )
 
@@ -73,16 +97,83 @@ class MQTTPublisher:
             )
 
 
+        self._loop_thread = None
+        if self.transport == "asyncio":
+            if self.loop is None:
+                self.loop = asyncio.get_event_loop()
+            self._loop_thread = threading.get_ident()
+            self.client.on_socket_open = self._on_socket_open
+            self.client.on_socket_close = self._on_socket_close
+            self.client.on_socket_register_write = self._on_socket_register_write
+            self.client.on_socket_unregister_write = self._on_socket_unregister_write
+
         # Try to connect
         try:
             self.log(f"🔌 Connecting to MQTT at {mqtt_host}:{mqtt_port}...")
+            if self.transport == "asyncio":
+                # the misc loop owns keepalive and reconnects from here on
+                self._misc_task = self.loop.create_task(self._misc_loop())
             self.client.connect(mqtt_host, mqtt_port, keepalive=60)
-            self.client.loop_start()
+            if self.transport != "asyncio":
+                self.client.loop_start()
         except Exception as e:
             self.log(f"❌ TCP connect error: {e}")
 
-    def log(self, msg: str):
-        self.logger(msg)
+    def log(self, msg: str, *args):
+        # formatting only happens when debug logging is on
+        if self.debug:
+            self.logger(msg % args if args else msg)
+
+    def _in_loop_thread(self) -> bool:
+        return self._loop_thread == threading.get_ident()
+
+    def run_in_loop(self, func, *args):
+        """
+        Run `func` on the thread that owns the MQTT client: inline for the thread
+        transport (or when already on the event loop), otherwise handed to the loop.
+        """
+        if self.transport != "asyncio" or self._in_loop_thread():
+            return func(*args)
+        self.loop.call_soon_threadsafe(func, *args)
+
+    def call_later(self, delay: float, func, *args):
+        """
+        Schedule `func` after `delay` seconds on the loop (asyncio transport) or a timer thread.
+        """
+        if self.transport == "asyncio":
+            self.run_in_loop(self.loop.call_later, delay, func, *args)
+        else:
+            timer = threading.Timer(delay, func, args)
+            timer.daemon = True
+            timer.start()
+
+    # --- asyncio transport: paho socket hooks ---------------------------------
+
+    def _on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        # publish() may be called from another thread (e.g. the web UI reload)
+        self.run_in_loop(self.loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self.run_in_loop(self.loop.remove_writer, sock)
+
+    async def _misc_loop(self):
+        self._loop_thread = threading.get_ident()
+        while not self._stopping:
+            if self.client.loop_misc() != mqtt.MQTT_ERR_SUCCESS:
+                try:
+                    self.client.reconnect()
+                except Exception as e:
+                    self.log(f"❌ TCP connect error: {e}")
+                    await asyncio.sleep(self.reconnect_delay)
+                    continue
+            await asyncio.sleep(1)
 
     def _on_connect(self, client, userdata, flags, rc):
         """
@@ -117,12 +208,12 @@ class MQTTPublisher:
         """
         try:
             topic = msg.topic
-            payload = msg.payload.decode()
-            self.log(f"📨 command: {topic} = {payload}")
+            payload = msg.payload if topic in self.raw_topics else msg.payload.decode()
+            self.log("📨 command: %s = %s", topic, payload)
 
             # Pass to external handler
             if self.on_message:
-                self.on_message(topic, payload)
+                self.on_message(topic, payload, bool(msg.retain))
 
         except Exception as e:
             self.log(f"❌ Error processing MQTT message: {e}")
@@ -132,26 +223,56 @@ class MQTTPublisher:
         Publish a message to MQTT with error handling.
 
         :param topic: Topic to publish
-        :param payload: Payload (dict or str)
+        :param payload: Payload (dict, str or bytes)
         :param qos: QoS level
         :param retain: Retain flag
         :return: True if published, False otherwise
         """
         try:
-            # If dict or object, serialize to JSON
-            if not isinstance(payload, str):
+            # bytes/str go out as-is (e.g. pre-serialized discovery), dict or object → JSON
+            if not isinstance(payload, (bytes, str, bytearray)):
                 payload = json.dumps(payload)
             result = self.client.publish(topic, payload=payload, qos=qos, retain=retain)
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                self.log(f"📤 Published to topic: {topic} payload:{payload}")
+                PUBLISHES.inc("emitted")
+                self.log("📤 Published to topic: %s payload:%s", topic, payload)
                 return True
             else:
+                PUBLISHES.inc("failed")
                 self.log(f" ❌  Failed to publish to {topic}, rc={result.rc}")
                 return False
         except Exception as e:
+            PUBLISHES.inc("failed")
             self.log(f" ❌ Exception during publish to {topic}: {e}")
             return False
 
+    def enqueue(self, topic: str, payload, qos=0, retain=False):
+        """
+        Queue a state publish; repeated updates to a topic inside the coalescing
+        window collapse to the latest payload. Publishes directly when coalescing is off.
+        """
+        if self.publish_queue is None:
+            return self.publish(topic, payload, qos=qos, retain=retain)
+        self.publish_queue.enqueue(topic, payload, qos, retain)
+        return True
+
+    def _publish_batch(self, batch) -> int:
+        failed = 0
+        for topic, payload, qos, retain in batch:
+            try:
+                if not isinstance(payload, (str, bytes, bytearray)):
+                    payload = json.dumps(payload)
+                if self.client.publish(topic, payload=payload, qos=qos, retain=retain).rc != mqtt.MQTT_ERR_SUCCESS:
+                    failed += 1
+            except Exception as e:
+                self.log(f" ❌ Exception during publish to {topic}: {e}")
+                failed += 1
+        PUBLISHES.inc("emitted", len(batch) - failed)
+        if failed:
+            PUBLISHES.inc("failed", failed)
+        self.log("📤 Flushed %d/%d queued messages", len(batch) - failed, len(batch))
+        return failed
+
     def subscribe(self, topic: str, qos=0):
         """
         Subscribe to a topic.
@@ -165,13 +286,29 @@ class MQTTPublisher:
         except Exception as e:
             self.log(f"❌ Subscription error for {topic}: {e}")
 
+    def unsubscribe(self, topic: str):
+        try:
+            self.client.unsubscribe(topic)
+            self.log(f"📡 Unsubscribed from {topic}")
+        except Exception as e:
+            self.log(f"❌ Unsubscribe error for {topic}: {e}")
+
+    @property
+    def connected(self) -> bool:
+        return self.client.is_connected()
+
     def stop(self):
         """
         Cleanly stop the MQTT client.
         """
         try:
             self.log(f"🔌 Stopping...")
-            self.client.loop_stop()
+            self._stopping = True
+            if self.transport == "asyncio":
+                if self._misc_task:
+                    self._misc_task.cancel()
+            else:
+                self.client.loop_stop()
             self.client.disconnect()
         except Exception as e:
             self.log(f"❌ Error while stopping: {e}")
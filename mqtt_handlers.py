@@ -1,66 +1,119 @@
 # mqtt_handlers.py
 import json
-import uuid
 import asyncio
-from datetime import datetime, timezone
+import time
 
 from config import (
     MQTT_HOST, MQTT_PORT, MQTT_USERNAME, MQTT_PASSWORD,
-    MQTT_DYNALITE_PREFIX, MQTT_BRIDGE_WILL, MQTT_DEBUG,
-    MQTT_DYNALITE_WILL, MQTT_HOMEASSISTANT_PREFIX
+    MQTT_BRIDGE_WILL, MQTT_DEBUG,
+    MQTT_HOMEASSISTANT_PREFIX, MQTT_TRANSPORT,
+    PUBLISH_COALESCE_MS, PUBLISH_BATCH_SIZE, STATE_SEED_SECONDS,
+    DYNET_BUS_RATE, DYNET_BUS_BURST, DYNET_BUS_QUEUE_MAX
 )
 from mqtt.publisher import MQTTPublisher
-from utils import log
+from correlation import new_response_id
+from bus_scheduler import DynetBusScheduler, PRIORITY_USER, PRIORITY_NAMES
+from recovery import replay_after_reconnect
+from gateways import GatewayTable
+from tracing import tracer
+from utils import log, WARNING, ERROR
 
 mqtt_client = None
-bridge_online = {"dynalite": False}
+connect_count = 0
+gateways = GatewayTable(bus_rate=DYNET_BUS_RATE)  # per-gateway topics, bus scheduler and online state
 
-def pub2dynet(type, hex_string,pending_responses, comment=""):
-    response_id = uuid.uuid4().hex
+def _send_to_dynet(gateway, type, hex_string, pending_responses, comment="", trace=None):
+    response_id = new_response_id()
     payload = {
         "type": type,
         "hex_string": hex_string,
         "response_id": response_id
     }
-    mqtt_client.publish(f"{MQTT_DYNALITE_PREFIX}/set", json.dumps(payload))
-    pending_responses[response_id] = {
-        "comment": comment,
-        "sent_at": datetime.now(timezone.utc)
-    }
+    pending_responses.add(response_id, comment)
+    mqtt_client.publish(gateway.set_topic, json.dumps(payload))
+    tracer.link_response(trace, response_id)
+
+def pub2dynet(type, hex_string,pending_responses, comment="", priority=PRIORITY_USER, area=None, trace=None):
+    # frames go to the gateway that owns the area, paced by that gateway's own scheduler
+    gateway = gateways.for_area(area)
+    scheduler = gateway.scheduler
+    if scheduler is None:
+        _send_to_dynet(gateway, type, hex_string, pending_responses, comment, trace)
+        return True
+
+    def send():
+        try:
+            _send_to_dynet(gateway, type, hex_string, pending_responses, comment, trace)
+        except Exception as e:
+            log("❌ Failed to send Dynet frame %s: %s", hex_string, e, level=ERROR, area=area)
+
+    if not scheduler.submit(send, priority=priority, area=area):
+        log("⚠️ Dynet bus queue full on %s — dropped %s frame %s", gateway.name, PRIORITY_NAMES[priority], hex_string,
+            level=WARNING, area=area)
+        return False
+    return True
+
+def _make_scheduler(rate):
+    if rate <= 0:
+        return None
+    return DynetBusScheduler(mqtt_client.call_later, rate=rate, burst=DYNET_BUS_BURST, max_queue=DYNET_BUS_QUEUE_MAX)
+
+def configure_gateways(dynalite_map) -> bool:
+    """Apply the gateways section of the map; (un)subscribes gateway topics when connected. True if gateways changed."""
+    added, removed = gateways.configure(dynalite_map, _make_scheduler)
+    if mqtt_client is None:
+        return bool(added or removed)
+    mqtt_client.raw_topics = gateways.raw_topics()
+    if mqtt_client.connected:
+        for gateway in removed:
+            for topic in gateway.topics():
+                mqtt_client.unsubscribe(topic)
+        for gateway in added:
+            for topic in gateway.topics():
+                mqtt_client.subscribe(topic)
+    return bool(added or removed)
 
 def handle_mqtt_connect(client, userdata, flags, rc):
+    global connect_count
     if rc != 0:
-        log(f"❌ Connection failed with code {rc}")
+        log("❌ Connection failed with code %s", rc, level=ERROR)
         return
 
     try:
-        client.subscribe(MQTT_DYNALITE_WILL)
-        log(f"📡 Subscribed to {MQTT_DYNALITE_WILL}")
-
-        client.subscribe(f"{MQTT_DYNALITE_PREFIX}/set/res/#")
-        log(f"📡 Subscribed to {MQTT_DYNALITE_PREFIX}/set/res/#")
-
-        client.subscribe(MQTT_DYNALITE_PREFIX)
-        log(f"📡 Subscribed to {MQTT_DYNALITE_PREFIX}")
+        for gateway in gateways:
+            for topic in gateway.topics():
+                client.subscribe(topic)
+                log(f"📡 Subscribed to {topic}")
 
         client.subscribe(f"{MQTT_HOMEASSISTANT_PREFIX}/light/+/+/brightness/set")
         log(f"📡 Subscribed to {MQTT_HOMEASSISTANT_PREFIX}/light/+/+/brightness/set")
+
+        # Read back retained states once to seed the publish-if-changed cache
+        if STATE_SEED_SECONDS > 0:
+            state_topic = f"{MQTT_HOMEASSISTANT_PREFIX}/light/+/+/brightness"
+            client.subscribe(state_topic)
+            mqtt_client.call_later(STATE_SEED_SECONDS, client.unsubscribe, state_topic)
+            log(f"📡 Seeding state cache from {state_topic} for {STATE_SEED_SECONDS}s")
     except Exception as e:
-        log(f"❌ Failed to subscribe: {e}")
+        log("❌ Failed to subscribe: %s", e, level=ERROR)
+
+    connect_count += 1
+    if connect_count > 1:
+        # broker may have lost retained discovery and HA its states
+        replay_after_reconnect(mqtt_client)
 
-def sweep_pending_responses(pending_responses,ttl=15):
+def sweep_pending_responses(pending_responses, interval=0.5):
     async def sweeper():
         while True:
-            now = datetime.now(timezone.utc)
-            expired = [rid for rid, meta in pending_responses.items()
-                       if (now - meta["sent_at"]).total_seconds() > ttl]
-            for rid in expired:
-                meta = pending_responses.pop(rid, None)
-                log(f"⚠️❌⚠️ Expired Response ID {rid} — Full data: {json.dumps(meta, default=str)}")
-            await asyncio.sleep(ttl)
+            for entry in pending_responses.expire():
+                age = (time.monotonic_ns() - entry.sent_at) / 1e9
+                log("⚠️❌⚠️ Expired Response ID %s — sent %.1fs ago, comment: %s", entry.response_id, age, entry.comment or '-',
+                    level=WARNING, response_id=entry.response_id)
+            tracer.expire()
+            await asyncio.sleep(interval)
     return sweeper()
 
-def start_mqtt(dynalite_map, on_message=None):
+def start_mqtt(dynalite_map, on_message=None, loop=None):
     global mqtt_client
     mqtt_client = MQTTPublisher(
         mqtt_username=MQTT_USERNAME,
@@ -68,8 +121,14 @@ def start_mqtt(dynalite_map, on_message=None):
         mqtt_host=MQTT_HOST,
         mqtt_port=MQTT_PORT,
         will_topic=f"{MQTT_BRIDGE_WILL}/status",
-        mqtt_debug=MQTT_DEBUG
+        mqtt_debug=MQTT_DEBUG,
+        transport=MQTT_TRANSPORT,
+        loop=loop,
+        coalesce_window=PUBLISH_COALESCE_MS / 1000,
+        batch_size=PUBLISH_BATCH_SIZE,
+        raw_topics=gateways.raw_topics()
     )
+    configure_gateways(dynalite_map)
     mqtt_client.on_connect = handle_mqtt_connect
     if on_message:
         mqtt_client.on_message = on_message
@@ -0,0 +1,115 @@
+# pending_responses.py
+import heapq
+import threading
+import time
+
+# ack round-trip histogram bucket upper bounds, seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class PendingResponse:
+    __slots__ = ("response_id", "comment", "sent_at", "deadline", "elapsed", "done")
+
+    def __init__(self, response_id, comment, sent_at, deadline):
+        self.response_id = response_id
+        self.comment = comment
+        self.sent_at = sent_at      # monotonic ns
+        self.deadline = deadline    # monotonic ns
+        self.elapsed = None         # seconds, set when acked
+        self.done = False
+
+
+class PendingResponses:
+    """
+    Outstanding gateway acks keyed by response id.
+
+    Deadlines live in a min-heap on monotonic integer time, so expire() only
+    touches entries that are due; acked entries are skipped lazily when their
+    deadline comes up. Ack round trips feed a cumulative latency histogram.
+    """
+
+    def __init__(self, ttl: float = 15.0):
+        self.ttl_ns = int(ttl * 1e9)
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._heap = []  # (deadline, seq, entry)
+        self._seq = 0
+
+        self.acked = 0
+        self.expired = 0
+        self.unknown = 0
+        self.latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)  # last bucket is +Inf
+        self.latency_sum = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, response_id):
+        return response_id in self._entries
+
+    def add(self, response_id, comment="") -> PendingResponse:
+        now = time.monotonic_ns()
+        entry = PendingResponse(response_id, comment, now, now + self.ttl_ns)
+        with self._lock:
+            self._entries[response_id] = entry
+            self._seq += 1
+            heapq.heappush(self._heap, (entry.deadline, self._seq, entry))
+        return entry
+
+    def pop(self, response_id):
+        """Resolve an ack; returns the entry (with `elapsed` set) or None if unknown/expired."""
+        now = time.monotonic_ns()
+        with self._lock:
+            entry = self._entries.pop(response_id, None)
+            if entry is None:
+                self.unknown += 1
+                return None
+            entry.done = True
+            entry.elapsed = (now - entry.sent_at) / 1e9
+            self.acked += 1
+            self.latency_sum += entry.elapsed
+            for idx, bound in enumerate(LATENCY_BUCKETS):
+                if entry.elapsed <= bound:
+                    break
+            else:
+                idx = len(LATENCY_BUCKETS)
+            self.latency_counts[idx] += 1
+        return entry
+
+    def expire(self, now=None) -> list:
+        """Remove and return entries whose deadline has passed."""
+        now = time.monotonic_ns() if now is None else now
+        expired = []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                entry = heapq.heappop(heap)[2]
+                if entry.done:
+                    continue
+                entry.done = True
+                self._entries.pop(entry.response_id, None)
+                expired.append(entry)
+            self.expired += len(expired)
+        return expired
+
+    def latency_percentile(self, q: float):
+        """Approximate ack latency percentile (bucket upper bound), None without data."""
+        total = sum(self.latency_counts)
+        if not total:
+            return None
+        rank = q * total
+        running = 0
+        for idx, count in enumerate(self.latency_counts):
+            running += count
+            if running >= rank:
+                return LATENCY_BUCKETS[idx] if idx < len(LATENCY_BUCKETS) else float("inf")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._entries),
+            "acked": self.acked,
+            "expired": self.expired,
+            "unknown": self.unknown,
+            "latency_sum": self.latency_sum,
+            "latency_buckets": dict(zip(LATENCY_BUCKETS + (float("inf"),), self.latency_counts))
+        }
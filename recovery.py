@@ -0,0 +1,38 @@
+# recovery.py
+# Bring Home Assistant back to a consistent view after a broker reconnect by
+# replaying cached discovery and last-known states, without rebuilding anything.
+import time
+from config import RECOVERY_BATCH_SIZE, RECOVERY_BATCH_INTERVAL_MS
+from discovery import published_discovery
+from state_cache import state_cache
+from utils import log
+
+stats = {"runs": 0, "messages": 0, "last_duration": 0.0, "in_progress": False}
+
+
+def replay_after_reconnect(mqtt_client, batch_size=RECOVERY_BATCH_SIZE,
+                           interval=RECOVERY_BATCH_INTERVAL_MS / 1000):
+    """
+    Republish retained discovery then last-known brightness in paced batches of
+    `batch_size`, `interval` seconds apart. Reports how long recovery took.
+    """
+    started = time.monotonic()
+    messages = [(topic, payload, True) for topic, payload in published_discovery()]
+    messages += [(topic, value, True) for topic, value in state_cache.items()]
+    stats["runs"] += 1
+    stats["in_progress"] = True
+    log(f"♻️ Reconnected — replaying {len(messages)} discovery/state messages")
+
+    def step(pos):
+        for topic, payload, retain in messages[pos:pos + batch_size]:
+            mqtt_client.publish(topic, payload, retain=retain)
+        pos += batch_size
+        if pos < len(messages):
+            mqtt_client.call_later(interval, step, pos)
+            return
+        stats["messages"] += len(messages)
+        stats["last_duration"] = time.monotonic() - started
+        stats["in_progress"] = False
+        log(f"♻️ Recovery complete: {len(messages)} messages in {stats['last_duration']:.2f}s")
+
+    step(0)
@@ -0,0 +1,92 @@
+# scene_planner.py
+import threading
+from config import SCENE_WINDOW_MS
+from metrics import registry
+
+SCENE_FRAMES_SAVED = registry.counter(
+    "dynalite_scene_frames_saved_total", "Dynet frames saved by sending one area preset for a batch of channel commands")
+
+
+class ScenePlanner:
+    """
+    Gathers HA channel commands per area for `window` seconds, so a scene that
+    sets many channels at once can go out as one area frame.
+
+    When the window closes the batch ({channel: preset}) goes to `plan`. If
+    `plan` returns True it has sent the whole batch itself. Otherwise each
+    command's own `run` is called in arrival order. Within a window only the
+    latest command per channel is kept.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._lock = threading.Lock()
+        self._batches = {}  # area -> [plan, {channel: (preset, run)}]
+        self.submitted = 0
+        self.superseded = 0
+        self.batches = 0
+        self.collapsed = 0
+
+    def submit(self, area, channel, preset, run, call_later, plan):
+        """
+        :param area: Area the command is for
+        :param channel: Channel as in the command topic
+        :param preset: Preset the command resolves to
+        :param run: Callable issuing this command on its own
+        :param call_later: Scheduler, call_later(delay_seconds, func, *args)
+        :param plan: plan(area, {channel: preset}) -> True if it sent the batch as one frame
+        """
+        if self.window <= 0:
+            with self._lock:
+                self.submitted += 1
+            run()
+            return
+
+        with self._lock:
+            self.submitted += 1
+            batch = self._batches.get(area)
+            if batch is not None:
+                if channel in batch[1]:
+                    self.superseded += 1
+                batch[1][channel] = (preset, run)
+                return
+            batch = self._batches[area] = [plan, {channel: (preset, run)}]
+
+        call_later(self.window, self._window_closed, area, batch)
+
+    def flush(self, area):
+        """Plan and send whatever is gathered for `area` now (e.g. before an area "all" command)."""
+        with self._lock:
+            batch = self._batches.pop(area, None)
+        if batch is not None:
+            self._send(area, batch)
+
+    def _window_closed(self, area, batch):
+        with self._lock:
+            if self._batches.get(area) is not batch:
+                return  # already flushed
+            del self._batches[area]
+        self._send(area, batch)
+
+    def _send(self, area, batch):
+        plan, commands = batch
+        collapsed = len(commands) > 1 and plan(area, {channel: preset for channel, (preset, _) in commands.items()})
+        with self._lock:
+            self.batches += 1
+            self.collapsed += bool(collapsed)
+        if collapsed:
+            return
+        for _, run in commands.values():
+            run()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._batches),
+            "submitted": self.submitted,
+            "superseded": self.superseded,
+            "batches": self.batches,
+            "collapsed": self.collapsed
+        }
+
+
+scene_planner = ScenePlanner(window=SCENE_WINDOW_MS / 1000)
@@ -0,0 +1,101 @@
+# state_cache.py
+import threading
+import time
+from collections import OrderedDict
+from config import STATE_CACHE_MAX, STATE_CACHE_TTL
+
+
+class StateCache:
+    """
+    Last-published brightness per state topic (bounded LRU).
+
+    A publish is suppressed when the topic already holds the same value, unless
+    the entry is older than `ttl` seconds (0 = never refresh).
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # topic -> (value, monotonic stamp)
+        self._seen = {}                # topic -> monotonic time of the last update, published or not
+        self.emitted = 0
+        self.suppressed = 0
+        self.seeded = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, topic: str):
+        entry = self._entries.get(topic)
+        return entry[0] if entry else None
+
+    def items(self):
+        with self._lock:
+            return [(topic, entry[0]) for topic, entry in self._entries.items()]
+
+    def last_seen(self, topic: str):
+        return self._seen.get(topic)
+
+    def should_publish(self, topic: str, value) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self._seen[topic] = now
+            entry = self._entries.get(topic)
+            if entry is not None and entry[0] == value and (not self.ttl or now - entry[1] < self.ttl):
+                self.suppressed += 1
+                return False
+            self._store(topic, value, now)
+            self.emitted += 1
+            return True
+
+    def seed(self, topic: str, value) -> bool:
+        """Remember a retained value seen on the broker, without overriding fresher state."""
+        with self._lock:
+            if topic in self._entries:
+                return False
+            self._store(topic, value, time.monotonic())
+            self.seeded += 1
+            return True
+
+    def forget(self, topic: str):
+        """Drop a topic whose entity is gone, so a re-added light publishes its state again."""
+        with self._lock:
+            self._entries.pop(topic, None)
+            self._seen.pop(topic, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._seen.clear()
+
+    def _store(self, topic, value, now):
+        self._entries[topic] = (value, now)
+        self._entries.move_to_end(topic)
+        while len(self._entries) > self.max_entries:
+            self._seen.pop(self._entries.popitem(last=False)[0], None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "emitted": self.emitted,
+            "suppressed": self.suppressed,
+            "seeded": self.seeded
+        }
+
+
+state_cache = StateCache(max_entries=STATE_CACHE_MAX, ttl=STATE_CACHE_TTL)
+
+
+def publish_if_changed(mqtt_client, topic: str, brightness: int) -> bool:
+    if not state_cache.should_publish(topic, brightness):
+        return False
+    # retained, so HA and the next bridge start can read the last state back
+    return mqtt_client.enqueue(topic, brightness, retain=True)
+
+
+def seed_from_retained(topic: str, payload: str):
+    try:
+        state_cache.seed(topic, int(float(payload)))
+    except (TypeError, ValueError):
+        pass
@@ -0,0 +1,149 @@
+# state_store.py
+# Optional on-disk store of the last brightness per (area, channel), so a
+# restarted bridge can republish known states before the bus sync finishes.
+import asyncio
+import os
+import struct
+import threading
+import time
+from config import STATE_STORE_PATH
+from config_loader import get_dynalite_index
+from state_cache import publish_if_changed
+from utils import log, WARNING, ERROR
+
+MAGIC = b"DYS1"
+RECORD = struct.Struct("<HHB")  # area, channel (0xFFFF = all), level
+CHANNEL_ALL = 0xFFFF
+
+
+def _channel_code(channel: str) -> int:
+    return CHANNEL_ALL if channel == "all" else int(channel)
+
+
+class StateStore:
+    """
+    Append-only log of fixed 5-byte records, last record per key wins.
+    The log is rewritten with only the live records once it grows past
+    `compact_ratio` times their number.
+    """
+
+    def __init__(self, path: str, compact_ratio: int = 4, compact_min: int = 4096):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self._lock = threading.Lock()
+        self._states = {}    # (area, channel code) -> level
+        self._records = 0    # records in the file
+        self._retry_at = 0   # after a failed compaction, wait for this many records
+        self._file = None
+        self.dirty = False
+
+    def load(self) -> dict:
+        """Read the log; returns {(area, channel str): level}."""
+        states = {}
+        records = 0
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            if data[:len(MAGIC)] == MAGIC:
+                body = memoryview(data)[len(MAGIC):]
+                usable = len(body) - len(body) % RECORD.size  # drop a torn last write
+                for area, channel, level in RECORD.iter_unpack(body[:usable]):
+                    states[(area, channel)] = level
+                    records += 1
+            elif data:
+                log("⚠️ State store %s has an unknown format — starting empty", self.path, level=WARNING)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log("❌ Failed to read state store %s: %s", self.path, e, level=ERROR)
+
+        with self._lock:
+            self._states = states
+            self._records = records
+        self._compact()
+        return {(area, "all" if channel == CHANNEL_ALL else str(channel)): level
+                for (area, channel), level in states.items()}
+
+    def record(self, area: int, channel: str, level: int):
+        key = (area, _channel_code(channel))
+        level = max(0, min(level, 255))
+        with self._lock:
+            if self._states.get(key) == level or self._file is None:
+                return
+            self._states[key] = level
+            self._file.write(RECORD.pack(key[0], key[1], level))
+            self._records += 1
+            self.dirty = True
+            if self._records > max(self.compact_min, self.compact_ratio * len(self._states), self._retry_at):
+                self._compact_locked()
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None and self.dirty:
+                self._file.flush()
+                self.dirty = False
+
+    def _compact(self):
+        with self._lock:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(MAGIC)
+                for (area, channel), level in self._states.items():
+                    f.write(RECORD.pack(area, channel, level))
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            os.replace(tmp, self.path)
+            self._records = len(self._states)
+            self._retry_at = 0
+            self.dirty = False
+        except Exception as e:
+            log("❌ Failed to compact state store %s: %s", self.path, e, level=ERROR)
+            # keep appending to the uncompacted log; try again once it has doubled
+            self._retry_at = 2 * self._records
+        try:
+            if self._file is None:
+                self._file = open(self.path, "ab")
+                if self._file.tell() == 0:
+                    self._file.write(MAGIC)
+        except Exception as e:
+            log("❌ Failed to open state store %s: %s", self.path, e, level=ERROR)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+state_store = StateStore(STATE_STORE_PATH) if STATE_STORE_PATH else None
+
+
+def restore_states(mqtt_client, dynalite_map) -> int:
+    """Republish stored levels for lights that are still mapped; returns how many."""
+    if state_store is None:
+        return 0
+    started = time.monotonic()
+    index = get_dynalite_index(dynalite_map)
+    restored = 0
+    for key, level in state_store.load().items():
+        entry = index.channels.get(key)
+        if entry is None:
+            continue
+        publish_if_changed(mqtt_client=mqtt_client, topic=entry.state_topic, brightness=level)
+        restored += 1
+    log(f"💾 Restored {restored} light states from {state_store.path} in {(time.monotonic() - started) * 1000:.1f}ms")
+    return restored
+
+
+def flush_state_store(interval=1.0):
+    async def flusher():
+        while True:
+            await asyncio.sleep(interval)
+            state_store.flush()
+    return flusher()
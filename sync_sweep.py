@@ -0,0 +1,96 @@
+# sync_sweep.py
+# Poll the real light levels of every mapped (area, channel) through the bus
+# scheduler, so Home Assistant knows the house state at startup and stays in sync.
+import asyncio
+import time
+from bus_scheduler import PRIORITY_BULK
+from config_loader import get_dynalite_index
+from helpers.dynet_frame import DynetFrame
+from state_cache import state_cache
+from utils import log, ERROR
+import mqtt_handlers
+
+stats = {"runs": 0, "requests": 0, "covered": 0, "entities": 0, "last_duration": 0.0}
+
+
+def plan_sync_requests(index):
+    """
+    One area-"all" request per area with a mapped master (its reply fans out to
+    every child channel), per-channel requests for areas without one.
+    `mode: level` channels are left out: a current-preset reply cannot report
+    their exact level, and the bridge already published what it set.
+
+    Returns:
+        list: (area, channel code for the frame, entries the reply covers)
+    """
+    plan = []
+    for area, children in index.children.items():
+        children = tuple(child for child in children if child.mode != "level")
+        master = index.channels.get((area, "all"))
+        if master is not None:
+            plan.append((area, 0xFF, (master,) + children))
+        else:
+            for child in children:
+                plan.append((area, int(child.channel), (child,)))
+    return plan
+
+
+def _pacing_gap(pending_responses, min_gap, max_gap):
+    # follow the gateway: space requests by about twice the median ack round trip
+    p50 = pending_responses.latency_percentile(0.5)
+    if p50 is None:
+        return max_gap / 4
+    return min(max(p50 * 2, min_gap), max_gap)
+
+
+async def run_sync_sweep(dynalite_map, pending_responses, min_gap=0.02, max_gap=1.0,
+                         max_backlog=20, settle=2.0):
+    started = time.monotonic()
+    index = get_dynalite_index(dynalite_map)
+    plan = plan_sync_requests(index)
+    expired_before = pending_responses.expired
+    log(f"🔎 Sync sweep: polling {len(plan)} requests for {sum(len(p[2]) for p in plan)} lights")
+
+    for area, channel, _ in plan:
+        scheduler = mqtt_handlers.gateways.for_area(area).scheduler
+        while scheduler is not None and scheduler.stats()["bulk"]["depth"] >= max_backlog:
+            await asyncio.sleep(max_gap / 4)
+        hex_msg = DynetFrame.request_current_preset(area=area, channel=channel).hex_string
+        mqtt_handlers.pub2dynet(type="dynet1", hex_string=hex_msg, pending_responses=pending_responses,
+                                comment="sync", priority=PRIORITY_BULK, area=area)
+        stats["requests"] += 1
+        gap = _pacing_gap(pending_responses, min_gap, max_gap)
+        if pending_responses.expired > expired_before:
+            gap = max_gap  # gateway is not keeping up, back off
+        await asyncio.sleep(gap)
+
+    # let the last replies arrive before measuring coverage
+    p99 = pending_responses.latency_percentile(0.99) or settle
+    await asyncio.sleep(min(max(p99 * 2, settle), 10.0))
+
+    entries = [entry for _, _, covered in plan for entry in covered]
+    covered = sum(1 for entry in entries
+                  if (state_cache.last_seen(entry.state_topic) or 0) >= started)
+    duration = time.monotonic() - started
+    stats["runs"] += 1
+    stats["covered"] = covered
+    stats["entities"] = len(entries)
+    stats["last_duration"] = duration
+    pct = 100 * covered / len(entries) if entries else 100
+    log(f"🔎 Sync sweep complete in {duration:.1f}s — {covered}/{len(entries)} lights confirmed ({pct:.0f}%)")
+    return stats
+
+
+def sync_sweep_loop(get_dynalite_map, pending_responses, start_delay=5.0, interval=0.0):
+    """Sweep once after `start_delay`, then every `interval` seconds (0 = startup only)."""
+    async def sweeper():
+        await asyncio.sleep(start_delay)
+        while True:
+            try:
+                await run_sync_sweep(get_dynalite_map(), pending_responses)
+            except Exception as e:
+                log("❌ Sync sweep failed: %s", e, level=ERROR)
+            if interval <= 0:
+                return
+            await asyncio.sleep(interval)
+    return sweeper()
@@ -0,0 +1,68 @@
+# test_discovery.py - incremental discovery publishes, failed publishes and entity removal
+import pytest
+
+import discovery
+from state_cache import state_cache
+
+STATE_TOPIC = "homeassistant/light/dynet_area_13/channel_2/brightness"
+
+
+class FakeClient:
+    def __init__(self):
+        self.accept = True
+        self.published = []
+        self.enqueued = []
+
+    def publish(self, topic, payload, retain=False):
+        if self.accept:
+            self.published.append((topic, payload, retain))
+        return self.accept
+
+    def enqueue(self, topic, payload, retain=False):
+        self.enqueued.append((topic, payload, retain))
+        return True
+
+
+@pytest.fixture(autouse=True)
+def fresh_discovery(monkeypatch):
+    monkeypatch.setattr(discovery, "_entity_cache", {})
+    monkeypatch.setattr(discovery, "_published", {})
+    state_cache.forget(STATE_TOPIC)
+
+
+def site(*channels):
+    return {"areas": {13: {"name": "Kitchen", "channels": {c: {"name": f"Light {c}"} for c in channels}}}}
+
+
+def test_rejected_publish_is_retried_on_the_next_reload():
+    client = FakeClient()
+    client.accept = False
+    report = discovery.publish_light_discovery(client, site("1"), incremental=True)
+    assert report["added"] == 0 and discovery._published == {}
+
+    client.accept = True
+    report = discovery.publish_light_discovery(client, site("1"), incremental=True)
+    assert report["added"] == 1 and len(client.published) == 1
+
+
+def test_removed_entity_clears_retained_config_and_state():
+    client = FakeClient()
+    discovery.publish_light_discovery(client, site("1", "2"))
+    state_cache.should_publish(STATE_TOPIC, 178)
+
+    report = discovery.publish_light_discovery(client, site("1"), incremental=True)
+    assert report == {"added": 0, "changed": 0, "removed": 1, "unchanged": 1}
+    assert client.published[-1] == ("homeassistant/light/dynet_area_13/channel_2/config", "", True)
+    assert client.enqueued == [(STATE_TOPIC, "", True)]
+    assert state_cache.get(STATE_TOPIC) is None
+
+
+def test_rejected_removal_is_retried():
+    client = FakeClient()
+    discovery.publish_light_discovery(client, site("1", "2"))
+    client.accept = False
+    assert discovery.publish_light_discovery(client, site("1"), incremental=True)["removed"] == 0
+    assert client.enqueued == []
+
+    client.accept = True
+    assert discovery.publish_light_discovery(client, site("1"), incremental=True)["removed"] == 1
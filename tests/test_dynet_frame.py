@@ -0,0 +1,87 @@
+# test_dynet_frame.py - DynetFrame must produce exactly what the helpers/dynet_mqtt builders do
+import pytest
+
+from helpers.dynet_frame import DynetFrame, DYNET1_LEN, dynet1_checksum
+from helpers.dynet_mqtt import (
+    build_area_preset_body,
+    build_channel_level_body,
+    build_request_current_preset,
+    build_request_set_preset_dyn1,
+    percent_to_dynet_level
+)
+
+
+@pytest.mark.parametrize("area,preset,channel,fade_time", [
+    (13, 1, 0xFF, 0.0),
+    (13, 4, 2, 0.0),
+    (201, 8, 1, 2.0),
+    (0, 0, 0, 10.0),     # preset/channel floor at 0, fade capped at 0xFF
+])
+def test_set_preset_dyn1_matches_builder(area, preset, channel, fade_time):
+    frame = DynetFrame.set_preset_dyn1(area=area, preset=preset, channel=channel, fade_time=fade_time)
+    assert frame.hex_string == build_request_set_preset_dyn1(area=area, preset=preset, channel=channel,
+                                                              fade_time=fade_time)
+
+
+@pytest.mark.parametrize("area,channel", [(13, 0xFF), (13, 1), (14, 3), (255, 0)])
+def test_request_current_preset_matches_builder(area, channel):
+    frame = DynetFrame.request_current_preset(area=area, channel=channel)
+    assert frame.hex_string == build_request_current_preset(area=area, channel=channel)
+
+
+@pytest.mark.parametrize("area,preset,fade,channel", [
+    (13, 2, 50, 0xFFFF),
+    (300, 17, 0x012345, 4),
+    (0, 0, 0, 0),
+])
+def test_area_preset_dyn2_matches_builder(area, preset, fade, channel):
+    frame = DynetFrame.area_preset_dyn2(area=area, preset=preset, fade=fade, channel=channel)
+    assert frame.hex_string == build_area_preset_body(area=area, preset=preset, fade=fade, channel=channel)
+
+
+@pytest.mark.parametrize("area,channel,percent,fade", [(13, 2, 50, 100), (16, 1, 100, 50), (16, 3, 0, 0)])
+def test_channel_level_dyn2_matches_builder(area, channel, percent, fade):
+    # the builder takes a percent, the codec the 0-254 level it converts to
+    frame = DynetFrame.channel_level_dyn2(area=area, channel=channel, level=percent_to_dynet_level(percent),
+                                          join=0xFF, fade=fade)
+    assert frame.hex_string == build_channel_level_body(area, channel, percent, 0xFF, fade=fade)
+
+
+def test_dynet1_checksum_makes_frame_sum_to_zero():
+    frame = DynetFrame.set_preset_dyn1(area=13, preset=2, channel=0xFF)
+    assert len(frame) == DYNET1_LEN
+    assert sum(frame.data) & 0xFF == 0
+    assert frame.data[-1] == dynet1_checksum(frame.data[:-1])
+
+
+@pytest.mark.parametrize("frame", [
+    DynetFrame.set_preset_dyn1(area=13, preset=2, channel=3),
+    DynetFrame.request_current_preset(area=14, channel=0xFF),
+    DynetFrame.dynet1(16, 1, 0x65, 0, 0),
+    DynetFrame.area_preset_dyn2(area=13, preset=2),
+    DynetFrame.channel_level_dyn2(area=13, channel=2, level=127, join=0xFF, fade=100),
+])
+def test_decode_round_trips(frame):
+    decoded = DynetFrame.decode(bytes(frame))
+    assert decoded == frame
+    assert decoded.type == frame.type
+    assert decoded.opcode == frame.opcode
+    assert decoded.area == frame.area
+    assert decoded.fields() == frame.fields()
+    # gateway hex form (Dynet1 without checksum) decodes to the same frame
+    assert DynetFrame.from_hex(frame.hex_string) == frame
+
+
+def test_decode_rejects_bad_checksum():
+    data = bytearray(DynetFrame.set_preset_dyn1(area=13, preset=2, channel=3).data)
+    data[-1] ^= 0x01
+    with pytest.raises(ValueError):
+        DynetFrame.decode(bytes(data))
+    # still decodable when the caller opts out of the check
+    assert DynetFrame.decode(bytes(data), check=False).area == 13
+
+
+@pytest.mark.parametrize("data", [b"", b"\x1c\x0d", b"\x99" * 8, b"\x11" * 5])
+def test_decode_rejects_unknown_layouts(data):
+    with pytest.raises(ValueError):
+        DynetFrame.decode(data)
@@ -0,0 +1,144 @@
+# test_local_broker.py - the LocalBroker/LocalMQTTClient test double used by benchmarks (the real
+# asyncio transport is covered in test_mqtt_publisher.py)
+import asyncio
+
+from mqtt.local_broker import LocalBroker, LocalMQTTClient
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    # the broker delivers with call_soon_threadsafe; a couple of loop turns flush it
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def make_client(broker, received, **kwargs):
+    return LocalMQTTClient(broker, on_message=lambda t, p, r: received.append((t, p, r)), **kwargs)
+
+
+def test_client_is_asyncio_transport_on_a_loop():
+    async def scenario():
+        client = LocalMQTTClient(LocalBroker(asyncio.get_running_loop()))
+        assert client.transport == "asyncio"
+    run(scenario())
+
+
+def test_publish_subscribe_with_wildcards():
+    async def scenario():
+        broker = LocalBroker(asyncio.get_running_loop())
+        received = []
+        sub = make_client(broker, received)
+        pub = LocalMQTTClient(broker)
+        sub.connect()
+        pub.connect()
+        sub.subscribe("homeassistant/light/+/+/brightness/set")
+        await settle()
+
+        pub.publish("homeassistant/light/dynet_area_13/channel_2/brightness/set", "128")
+        pub.publish("homeassistant/light/dynet_area_13/channel_2/brightness", "128")
+        await settle()
+        assert received == [("homeassistant/light/dynet_area_13/channel_2/brightness/set", "128", False)]
+
+        sub.unsubscribe("homeassistant/light/+/+/brightness/set")
+        pub.publish("homeassistant/light/dynet_area_13/channel_2/brightness/set", "0")
+        await settle()
+        assert len(received) == 1
+    run(scenario())
+
+
+def test_retained_messages_reach_late_subscribers_flagged_retained():
+    async def scenario():
+        broker = LocalBroker(asyncio.get_running_loop())
+        pub = LocalMQTTClient(broker)
+        pub.connect()
+        pub.publish("state/a", 77, retain=True)
+        pub.publish("state/b", "cleared", retain=True)
+        pub.publish("state/b", "", retain=True)   # empty retained payload clears it
+
+        received = []
+        sub = make_client(broker, received)
+        sub.connect()
+        sub.subscribe("state/#")
+        await settle()
+        assert received == [("state/a", "77", True)]
+
+        pub.publish("state/a", 78, retain=True)
+        await settle()
+        assert received[-1] == ("state/a", "78", False)
+    run(scenario())
+
+
+def test_raw_topics_are_delivered_as_bytes():
+    async def scenario():
+        broker = LocalBroker(asyncio.get_running_loop())
+        received = []
+        sub = make_client(broker, received, raw_topics=("dynalite/raw",))
+        sub.connect()
+        sub.subscribe("dynalite/raw")
+        LocalMQTTClient(broker).connect()
+        broker.publish("dynalite/raw", b"\x1c\x0d\x00\x6b\x01\x00\xff\x6c")
+        await settle()
+        assert received == [("dynalite/raw", b"\x1c\x0d\x00\x6b\x01\x00\xff\x6c", False)]
+    run(scenario())
+
+
+def test_lwt_online_on_connect_and_will_on_unexpected_disconnect():
+    async def scenario():
+        broker = LocalBroker(asyncio.get_running_loop())
+        received = []
+        watcher = make_client(broker, received)
+        watcher.connect()
+        watcher.subscribe("bridges/light_dynalite")
+        await settle()
+
+        connects = []
+        bridge = LocalMQTTClient(broker, will_topic="bridges/light_dynalite",
+                                 on_connect=lambda client, userdata, flags, rc: connects.append(rc))
+        bridge.connect()
+        await settle()
+        assert connects == [0]
+        assert received == [("bridges/light_dynalite", "online", False)]
+        assert broker.retained["bridges/light_dynalite"] == b"online"
+
+        bridge.stop(unexpected=True)
+        await settle()
+        assert received[-1] == ("bridges/light_dynalite", "offline", False)
+        assert broker.retained["bridges/light_dynalite"] == b"offline"
+        assert not bridge.publish("x", "dropped while disconnected")
+    run(scenario())
+
+
+def test_clean_disconnect_does_not_fire_will():
+    async def scenario():
+        broker = LocalBroker(asyncio.get_running_loop())
+        bridge = LocalMQTTClient(broker, will_topic="bridges/light_dynalite")
+        bridge.connect()
+        await settle()
+        bridge.stop()
+        await settle()
+        assert broker.retained["bridges/light_dynalite"] == b"online"
+    run(scenario())
+
+
+def test_enqueue_coalesces_per_topic_on_the_loop():
+    async def scenario():
+        broker = LocalBroker(asyncio.get_running_loop())
+        received = []
+        sub = make_client(broker, received)
+        sub.connect()
+        sub.subscribe("state/#")
+        pub = LocalMQTTClient(broker, coalesce_window=0.01)
+        pub.connect()
+        await settle()
+
+        for value in (1, 2, 3):
+            pub.enqueue("state/a", value, retain=True)
+        pub.enqueue("state/b", 9)
+        await asyncio.sleep(0.05)
+        await settle()
+        assert received == [("state/a", "3", False), ("state/b", "9", False)]
+        assert broker.retained == {"state/a": b"3"}
+    run(scenario())
@@ -0,0 +1,239 @@
+# test_mqtt_publisher.py - MQTTPublisher(transport="asyncio") against a minimal MQTT 3.1.1 broker on localhost
+# Covers the on_socket_* hooks (all socket I/O runs on the loop), run_in_loop and
+# call_later from other threads, LWT, and the _misc_loop reconnect.
+import asyncio
+import struct
+import threading
+import warnings
+
+from paho.mqtt.client import topic_matches_sub
+
+from mqtt.publisher import MQTTPublisher
+
+
+def _string(data, pos):
+    (size,) = struct.unpack_from(">H", data, pos)
+    return data[pos + 2:pos + 2 + size], pos + 2 + size
+
+
+def _packet(kind, body=b""):
+    length, size = bytearray(), len(body)
+    while True:
+        byte, size = size % 128, size // 128
+        length.append(byte | (0x80 if size else 0))
+        if not size:
+            return bytes([kind]) + bytes(length) + body
+
+
+def _publish(topic, payload, retain):
+    topic = topic.encode()
+    return _packet(0x30 | int(retain), struct.pack(">H", len(topic)) + topic + payload)
+
+
+class MiniBroker:
+    """QoS 0 only: CONNECT (with will), PUBLISH (retained), (UN)SUBSCRIBE, PINGREQ, DISCONNECT."""
+
+    def __init__(self):
+        self.retained = {}
+        self.sessions = {}   # writer -> [subscriptions, will]
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        for writer in list(self.sessions):
+            writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    def kick(self):
+        """Drop every connection without a DISCONNECT, as a network failure would."""
+        for writer in list(self.sessions):
+            writer.transport.abort()
+
+    def route(self, topic, payload, retain):
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+        for writer, (subscriptions, _) in list(self.sessions.items()):
+            if any(topic_matches_sub(pattern, topic) for pattern in subscriptions):
+                writer.write(_publish(topic, payload, False))
+
+    async def _read(self, reader):
+        header = await reader.readexactly(1)
+        size, shift = 0, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            size += (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header[0], await reader.readexactly(size)
+
+    async def _serve(self, reader, writer):
+        session = self.sessions[writer] = [set(), None]
+        clean = False
+        try:
+            while True:
+                kind, body = await self._read(reader)
+                packet = kind >> 4
+                if packet == 1:       # CONNECT
+                    _, pos = _string(body, 0)
+                    flags = body[pos + 1]
+                    _, pos = _string(body, pos + 4)   # client id
+                    if flags & 0x04:
+                        will_topic, pos = _string(body, pos)
+                        will_payload, pos = _string(body, pos)
+                        session[1] = (will_topic.decode(), will_payload, bool(flags & 0x20))
+                    writer.write(_packet(0x20, b"\x00\x00"))
+                elif packet == 3:     # PUBLISH, QoS 0
+                    topic, pos = _string(body, 0)
+                    self.route(topic.decode(), body[pos:], bool(kind & 0x01))
+                elif packet == 8:     # SUBSCRIBE
+                    pos, granted = 2, bytearray()
+                    while pos < len(body):
+                        pattern, pos = _string(body, pos)
+                        pos += 1
+                        session[0].add(pattern.decode())
+                        granted.append(0)
+                        for topic, payload in self.retained.items():
+                            if topic_matches_sub(pattern.decode(), topic):
+                                writer.write(_publish(topic, payload, True))
+                    writer.write(_packet(0x90, body[:2] + bytes(granted)))
+                elif packet == 10:    # UNSUBSCRIBE
+                    pos = 2
+                    while pos < len(body):
+                        pattern, pos = _string(body, pos)
+                        session[0].discard(pattern.decode())
+                    writer.write(_packet(0xB0, body[:2]))
+                elif packet == 12:    # PINGREQ
+                    writer.write(_packet(0xD0))
+                elif packet == 14:    # DISCONNECT
+                    clean = True
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            del self.sessions[writer]
+            writer.close()
+            if not clean and session[1] is not None:
+                self.route(*session[1])
+
+
+async def until(predicate, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def make_publisher(port, loop, received, connects):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)   # paho 2.x callback API v1
+        return MQTTPublisher(
+            "", "", port, "127.0.0.1", will_topic="bridges/test", transport="asyncio", loop=loop,
+            reconnect_delay=0.05,
+            on_connect=lambda client, userdata, flags, rc: connects.append(threading.get_ident()),
+            on_message=lambda topic, payload, retain: received.append((topic, payload, retain)))
+
+
+def test_asyncio_transport_publish_subscribe_and_lwt():
+    async def scenario():
+        broker = MiniBroker()
+        port = await broker.start()
+        broker.retained["state/seed"] = b"77"
+        received, connects = [], []
+        loop_thread = threading.get_ident()
+        publisher = make_publisher(port, asyncio.get_running_loop(), received, connects)
+        try:
+            await until(lambda: connects)
+            assert connects == [loop_thread]          # callbacks run on the event loop
+            await until(lambda: broker.retained.get("bridges/test") == b"online")
+
+            publisher.subscribe("state/#")
+            await until(lambda: received)
+            assert received == [("state/seed", "77", True)]
+
+            assert publisher.publish("state/live", {"brightness": 5})
+            await until(lambda: len(received) == 2)
+            assert received[1] == ("state/live", '{"brightness": 5}', False)
+
+            publisher.unsubscribe("state/#")
+            await asyncio.sleep(0.05)
+            publisher.publish("state/live", "ignored")
+            await asyncio.sleep(0.05)
+            assert len(received) == 2
+        finally:
+            publisher.stop()
+            await asyncio.sleep(0.05)
+            # a clean DISCONNECT does not fire the will
+            assert broker.retained["bridges/test"] == b"online"
+            await broker.close()
+
+    asyncio.run(scenario())
+
+
+def test_asyncio_transport_cross_thread_publish_run_in_loop_and_call_later():
+    async def scenario():
+        broker = MiniBroker()
+        port = await broker.start()
+        received, connects = [], []
+        loop_thread = threading.get_ident()
+        publisher = make_publisher(port, asyncio.get_running_loop(), received, connects)
+        try:
+            await until(lambda: connects)
+            publisher.subscribe("web/#")
+            await asyncio.sleep(0.05)
+
+            ran_on = []
+
+            def from_web_thread():
+                # e.g. a web UI reload: the publish write is handed to the loop by on_socket_register_write
+                publisher.publish("web/reload", "1")
+                publisher.run_in_loop(lambda: ran_on.append(("run_in_loop", threading.get_ident())))
+                publisher.call_later(0.01, lambda: ran_on.append(("call_later", threading.get_ident())))
+
+            worker = threading.Thread(target=from_web_thread)
+            worker.start()
+            worker.join()
+            await until(lambda: received and len(ran_on) == 2)
+            assert received == [("web/reload", "1", False)]
+            assert sorted(ran_on) == [("call_later", loop_thread), ("run_in_loop", loop_thread)]
+
+            # on the loop itself run_in_loop is inline
+            inline = []
+            publisher.run_in_loop(inline.append, 1)
+            assert inline == [1]
+        finally:
+            publisher.stop()
+            await broker.close()
+
+    asyncio.run(scenario())
+
+
+def test_asyncio_transport_reconnects_after_connection_loss():
+    async def scenario():
+        broker = MiniBroker()
+        port = await broker.start()
+        received, connects = [], []
+        publisher = make_publisher(port, asyncio.get_running_loop(), received, connects)
+        try:
+            await until(lambda: connects)
+            await until(lambda: broker.retained.get("bridges/test") == b"online")
+
+            broker.kick()
+            # the broker publishes the will for the lost connection...
+            await until(lambda: broker.retained.get("bridges/test") == b"offline")
+            # ...and the misc loop reconnects, which re-announces online
+            await until(lambda: len(connects) == 2)
+            await until(lambda: broker.retained.get("bridges/test") == b"online")
+            assert publisher.connected
+        finally:
+            publisher.stop()
+            await broker.close()
+
+    asyncio.run(scenario())
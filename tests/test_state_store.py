@@ -0,0 +1,38 @@
+# test_state_store.py - StateStore append log, clamping and compaction failures
+import os
+
+from state_store import StateStore
+
+
+def open_store(path, **kwargs):
+    store = StateStore(str(path), **kwargs)
+    assert store.load() == {}
+    return store
+
+
+def test_levels_are_clamped_before_they_are_stored(tmp_path):
+    store = open_store(tmp_path / "states.bin")
+    store.record(13, "1", 300)
+    store.record(13, "1", 255)   # same stored level, nothing appended
+    store.record(13, "all", -5)
+    store.close()
+
+    assert os.path.getsize(tmp_path / "states.bin") == 4 + 2 * 5
+    assert StateStore(str(tmp_path / "states.bin")).load() == {(13, "1"): 255, (13, "all"): 0}
+
+
+def test_failed_compaction_keeps_appending(tmp_path, monkeypatch):
+    path = tmp_path / "states.bin"
+    store = open_store(path, compact_ratio=1, compact_min=2)
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    for level in range(1, 6):
+        store.record(1, "1", level)
+    monkeypatch.undo()
+    store.record(1, "1", 200)
+    store.close()
+
+    assert StateStore(str(path)).load() == {(1, "1"): 200}
@@ -0,0 +1,156 @@
+# topic_router.py
+# Topic → handler dispatch on a trie over topic levels. Capturing levels parse
+# their value once (e.g. "dynet_area_16" → 16) and the parsed values are handed
+# to the handler; results for cacheable routes are memoized per topic.
+import time
+from metrics import MESSAGES_RECEIVED, HANDLER_SECONDS
+from utils import log, ERROR
+
+
+def prefixed_int(prefix: str):
+    """Capture parser for levels like "dynet_area_16" → 16."""
+    skip = len(prefix)
+
+    def parse(level):
+        if level.startswith(prefix) and level[skip:].isdigit():
+            return int(level[skip:])
+        return None
+    return parse
+
+
+def prefixed_channel(prefix: str):
+    """Capture parser for levels like "channel_2" → "2" and "channel_all" → "all"."""
+    skip = len(prefix)
+
+    def parse(level):
+        if level.startswith(prefix):
+            channel = level[skip:]
+            if channel == "all" or channel.isdigit():
+                return channel
+        return None
+    return parse
+
+
+def any_level(level):
+    return level or None
+
+
+class Route:
+    __slots__ = ("name", "handler", "cache", "prepare", "retained_only")
+
+    def __init__(self, name, handler, cache, prepare=None, retained_only=False):
+        self.name = name
+        self.handler = handler
+        self.cache = cache
+        self.prepare = prepare
+        self.retained_only = retained_only
+
+
+class _Node:
+    __slots__ = ("children", "captures", "route")
+
+    def __init__(self):
+        self.children = {}   # exact level -> _Node
+        self.captures = []   # (parser, _Node)
+        self.route = None
+
+
+class TopicRouter:
+    """
+    Routes are topic patterns given as a list of levels: a str matches exactly,
+    a callable parses the level and captures its value (None = no match).
+    Handlers are called as handler(topic, payload, *captures).
+
+    A route's `prepare(payload, *captures) -> (key, payload)` runs before
+    dispatch. It picks the dispatcher key (default: the captures, else the
+    topic) and may hand the handler an already parsed payload.
+    """
+
+    def __init__(self, cache_size: int = 8192, dispatcher=None):
+        self.dispatcher = dispatcher   # KeyedDispatcher, or None to run handlers inline
+        self._root = _Node()
+        self._cache = {}     # topic -> (Route, captures)
+        self.cache_size = cache_size
+        self.unrouted = 0
+
+    def add(self, levels, handler, name: str, cache: bool = False, prepare=None, retained_only: bool = False):
+        """
+        Register a route; `cache` memoizes the parse per topic (for bounded topic sets),
+        `retained_only` ignores live messages and handles only retained ones.
+        """
+        node = self._root
+        for level in levels:
+            if callable(level):
+                for parser, child in node.captures:
+                    if parser is level:
+                        node = child
+                        break
+                else:
+                    child = _Node()
+                    node.captures.append((level, child))
+                    node = child
+            else:
+                node = node.children.setdefault(level, _Node())
+        node.route = Route(name, handler, cache, prepare, retained_only)
+        self._cache.clear()
+        return node.route
+
+    def match(self, topic: str):
+        """(Route, captures) for `topic`, or None."""
+        return self._match(self._root, topic.split("/"), 0, ())
+
+    def _match(self, node, levels, depth, captured):
+        if depth == len(levels):
+            return (node.route, captured) if node.route is not None else None
+        level = levels[depth]
+        child = node.children.get(level)
+        if child is not None:
+            hit = self._match(child, levels, depth + 1, captured)
+            if hit is not None:
+                return hit
+        for parser, child in node.captures:
+            value = parser(level)
+            if value is not None:
+                hit = self._match(child, levels, depth + 1, captured + (value,))
+                if hit is not None:
+                    return hit
+        return None
+
+    def dispatch(self, topic: str, payload, retain: bool = False) -> bool:
+        hit = self._cache.get(topic)
+        if hit is None:
+            hit = self.match(topic)
+            if hit is None:
+                self.unrouted += 1
+                MESSAGES_RECEIVED.inc("other")
+                return False
+            if hit[0].cache:
+                if len(self._cache) >= self.cache_size:
+                    self._cache.clear()
+                self._cache[topic] = hit
+
+        route, captured = hit
+        if route.retained_only and not retain:
+            return False
+        MESSAGES_RECEIVED.inc(route.name)
+        key = captured or topic
+        if route.prepare is not None:
+            try:
+                key, payload = route.prepare(payload, *captured)
+            except Exception as e:
+                log("❌ Failed to prepare %s message: %s", route.name, e, level=ERROR)
+                return False
+            if key is None:
+                key = topic
+        if self.dispatcher is not None:
+            # same key (e.g. area) → same worker, in arrival order
+            return self.dispatcher.submit(key, route.name, route.handler, topic, payload, *captured)
+        started = time.perf_counter()
+        try:
+            route.handler(topic, payload, *captured)
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, route.name)
+        return True
+
+    def stats(self) -> dict:
+        return {"cached_topics": len(self._cache), "unrouted": self.unrouted}
@@ -0,0 +1,196 @@
+# tracing.py
+# Sampled end-to-end traces of HA commands: when each stage of a command
+# happened, correlated through the response ids of the frames it produced.
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from config import TRACE_SAMPLE_RATE, TRACE_DUMP_PATH, TRACE_TTL, TRACE_WINDOW
+from utils import log, ERROR
+
+STAGES = (
+    "ha_received",        # HA brightness/set message handled
+    "frame_built",        # Dynet frame encoded (after debouncing)
+    "dynet_published",    # frame published to {prefix}/set
+    "gateway_ack",        # first set/res/<id> ack for the trace
+    "confirm_requested",  # current-preset request published
+    "preset_reply",       # gateway reported the channel's preset
+    "state_published"     # confirmed state handed to the publisher
+)
+
+
+class Trace:
+    __slots__ = ("key", "started", "stamps", "response_ids")
+
+    def __init__(self, key, started):
+        self.key = key
+        self.started = started    # monotonic ns
+        self.stamps = {"ha_received": started}
+        self.response_ids = []
+
+    def offsets(self) -> dict:
+        """Stage → milliseconds since the HA command arrived."""
+        return {stage: (self.stamps[stage] - self.started) / 1e6 for stage in STAGES if stage in self.stamps}
+
+
+class Tracer:
+    """
+    Samples one in every 1/`sample_rate` HA commands (0 disables tracing).
+    While a key (area, channel) is being traced further commands for it join
+    the same trace, so a slider drag is followed through to its final reply.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, ttl: float = 30.0, window: int = 1024):
+        self.every = round(1 / sample_rate) if sample_rate > 0 else 0
+        self.ttl_ns = int(ttl * 1e9)
+        self._lock = threading.Lock()
+        self._seen = 0
+        self._active = {}         # key -> Trace
+        self._by_response = {}    # response id -> Trace
+        self._samples = {stage: deque(maxlen=window) for stage in STAGES}
+        self._finished = deque(maxlen=window)   # completed traces not yet dumped
+        self.started = 0
+        self.completed = 0
+        self.expired = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.every > 0
+
+    def begin(self, key):
+        """Start a trace for an HA command if it is sampled; returns the trace or None."""
+        if not self.every:
+            return None
+        with self._lock:
+            trace = self._active.get(key)
+            if trace is not None:
+                return trace
+            self._seen += 1
+            if self._seen % self.every:
+                return None
+            trace = self._active[key] = Trace(key, time.monotonic_ns())
+            self.started += 1
+            return trace
+
+    def mark(self, trace, stage):
+        """Record a stage the first time it happens."""
+        if trace is not None and stage not in trace.stamps:
+            trace.stamps[stage] = time.monotonic_ns()
+
+    def link_response(self, trace, response_id):
+        if trace is None:
+            return
+        with self._lock:
+            if self._active.get(trace.key) is not trace:
+                return  # already finished or expired; a late frame must not hold it in _by_response
+            self.mark(trace, "dynet_published")
+            trace.response_ids.append(response_id)
+            self._by_response[response_id] = trace
+
+    def ack(self, response_id):
+        if response_id not in self._by_response:
+            return
+        with self._lock:
+            trace = self._by_response.pop(response_id, None)
+        self.mark(trace, "gateway_ack")
+
+    def reply(self, key):
+        """A preset report arrived for `key`; returns the trace waiting on it, if any."""
+        trace = self._active.get(key)
+        if trace is None or "confirm_requested" not in trace.stamps:
+            return None
+        self.mark(trace, "preset_reply")
+        return trace
+
+    def finish(self, trace):
+        self.mark(trace, "state_published")
+        with self._lock:
+            if self._active.get(trace.key) is trace:
+                del self._active[trace.key]
+            self._forget_responses(trace)
+            self._record(trace)
+            self.completed += 1
+
+    def expire(self, now=None):
+        """Drop traces that never completed; the stages they did reach still count."""
+        if not self._active:
+            return
+        now = time.monotonic_ns() if now is None else now
+        with self._lock:
+            for key, trace in list(self._active.items()):
+                if now - trace.started > self.ttl_ns:
+                    del self._active[key]
+                    self._forget_responses(trace)
+                    self._record(trace)
+                    self.expired += 1
+
+    def _forget_responses(self, trace):
+        for response_id in trace.response_ids:
+            self._by_response.pop(response_id, None)
+
+    def _record(self, trace):
+        for stage, offset in trace.offsets().items():
+            self._samples[stage].append(offset)
+        self._finished.append(trace)
+
+    def percentiles(self, quantiles=(0.5, 0.9, 0.99)) -> dict:
+        """Per-stage {count, p50, p90, p99} in ms since the HA command, over the recent window."""
+        report = {}
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+        for stage, values in samples.items():
+            if not values:
+                continue
+            row = {"count": len(values)}
+            for q in quantiles:
+                row[f"p{round(q * 100)}"] = round(values[min(len(values) - 1, int(q * len(values)))], 3)
+            report[stage] = row
+        return report
+
+    def stats(self) -> dict:
+        return {
+            "sample_every": self.every,
+            "active": len(self._active),
+            "started": self.started,
+            "completed": self.completed,
+            "expired": self.expired,
+            "stages": self.percentiles()
+        }
+
+    def drain(self) -> list:
+        with self._lock:
+            finished = list(self._finished)
+            self._finished.clear()
+        return finished
+
+
+tracer = Tracer(sample_rate=TRACE_SAMPLE_RATE, ttl=TRACE_TTL, window=TRACE_WINDOW)
+
+
+def dump_traces(path: str) -> int:
+    """Append finished traces and the current per-stage summary to `path` as JSON lines."""
+    finished = tracer.drain()
+    if not finished:
+        return 0
+    with open(path, "a") as f:
+        for trace in finished:
+            f.write(json.dumps({
+                "area": trace.key[0],
+                "channel": trace.key[1],
+                "response_ids": trace.response_ids,
+                "stages_ms": trace.offsets()
+            }) + "\n")
+        f.write(json.dumps({"summary": tracer.percentiles()}) + "\n")
+    return len(finished)
+
+
+def trace_dump_loop(path=TRACE_DUMP_PATH, interval=10.0):
+    async def dumper():
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                dump_traces(path)
+            except Exception as e:
+                log("❌ Failed to write traces to %s: %s", path, e, level=ERROR)
+    return dumper()
@@ -1,9 +1,95 @@
 # utils.py
-from datetime import datetime
+import atexit
+import json
+import queue
+import sys
+import threading
+import time
+from config import LOG_LEVEL, LOG_FORMAT, LOG_ASYNC
 
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+_min_level = {name: lvl for lvl, name in LEVEL_NAMES.items()}.get(str(LOG_LEVEL).upper(), INFO)
 
-def log(msg: str):
-    print(f"{datetime.now().strftime('%H:%M:%S')} 🧠 {msg}")
+_log_queue = queue.SimpleQueue()
+_writer = None
+_writer_lock = threading.Lock()
+_stamp_cache = [0, ""]  # second, "%H:%M:%S"
+
+
+def log_enabled(level: int = INFO) -> bool:
+    return level >= _min_level
+
+
+def log(msg: str, *args, level: int = INFO, tag: str = "🧠", **fields):
+    """
+    Leveled, lazy log call: `msg % args` and any structured `fields` are only
+    rendered by the background writer, and nothing is queued below LOG_LEVEL.
+    """
+    if level < _min_level:
+        return
+    record = (time.time(), level, tag, msg, args, fields)
+    if not LOG_ASYNC:
+        _write(record)
+        return
+    if _writer is None:
+        _start_writer()
+    _log_queue.put(record)
+
+
+def _format(record) -> str:
+    ts, level, tag, msg, args, fields = record
+    if args:
+        try:
+            msg = msg % args
+        except (TypeError, ValueError):
+            msg = f"{msg} {args}"
+    if LOG_FORMAT == "json":
+        return json.dumps({"ts": ts, "level": LEVEL_NAMES.get(level, level), "msg": msg, **fields},
+                          default=str, ensure_ascii=False)
+    second = int(ts)
+    if _stamp_cache[0] != second:
+        _stamp_cache[0] = second
+        _stamp_cache[1] = time.strftime("%H:%M:%S", time.localtime(ts))
+    if fields:
+        msg += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+    return f"{_stamp_cache[1]} {tag} {msg}"
+
+
+def _write(record):
+    try:
+        sys.stdout.write(_format(record) + "\n")
+        sys.stdout.flush()
+    except Exception:
+        pass
+
+
+def _writer_loop():
+    while True:
+        record = _log_queue.get()
+        if record is None:
+            return
+        _write(record)
+
+
+def _start_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name="log-writer", daemon=True)
+            _writer.start()
+
+
+def flush_logs(timeout: float = 2.0):
+    """Stop the writer after it drained everything queued so far."""
+    global _writer
+    if _writer is not None:
+        _log_queue.put(None)
+        _writer.join(timeout)
+        _writer = None
+
+
+atexit.register(flush_logs)
 
 
 def percent_to_brightness(percent_str):
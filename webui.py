@@ -1,5 +1,5 @@
 # web_ui.py
-from flask import Flask, request, render_template_string, redirect, url_for, flash
+from flask import Flask, Response, jsonify, request, render_template_string, redirect, url_for, flash
 import yaml
 import os
 import time
@@ -7,6 +7,8 @@ from threading import Thread
 from config import (
      CONFIG_PATH, CONFIG_PORT
 )
+from metrics import registry
+from tracing import tracer
 
 _reload_func = None
 
@@ -39,6 +41,14 @@ def editor():
             content = ""
         return render_template_string(TEMPLATE, yaml_content=content)
 
+@app.route("/metrics")
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/trace")
+def trace():
+    return jsonify(tracer.stats())
+
 TEMPLATE = """
 <!doctype html>
 <title>Dynalite Map Editor</title>